@@ -1,4 +1,13 @@
-from cli import clack
+from .lib_complete import complete_from_env
 
-if __name__ == '__main__':
+
+def main():
+    # Completion requests of the shell are answered without importing the cli.
+    if complete_from_env():
+        return
+    from .cli import clack
     clack()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,17 @@
 
 import click
 
-from cmd_call import CallCommands
-from cmd_settings import SettingsCommands
-from environment import COMMON_SETTINGS
-from environment import FIND_USERS_BY
-from environment import Environment
-from version import VERSION
+from .cmd_batch import BatchCommands
+from .cmd_call import CallCommands
+from .cmd_diff import DiffCommands
+from .cmd_jobs import JobsCommands
+from .cmd_settings import SettingsCommands
+from .environment import COMMON_SETTINGS
+from .environment import FIND_USERS_BY
+from .environment import TABLE_OUTPUTS
+from .environment import Environment
+from .lib_input import INPUT_FORMATS
+from .version import VERSION
 
 env = Environment()
 
@@ -56,7 +61,8 @@ def clack():
 @click.command(
     "call",
     help="Make api calls",
-    epilog="Params are defined as a python dictionary e.g. \"{'test': True, 'foo': 'bar'}\"\n\n"
+    epilog="Params are defined as a python dictionary or json e.g. \"{'test': True, 'foo': 'bar'}\". "
+           "Use @FILE to read the params from a file or - to read them from stdin.\n\n"
            "Color scheme options are: " + ", ".join(COMMON_SETTINGS['color_scheme']['options']) + "\n\n"
            "Env (settings) names are: " + ", ".join(env.sections),
 )
@@ -64,8 +70,16 @@ def clack():
     '--env', '-e',
     metavar="NAME",
     type=click.Choice(env.sections),
-    help='Choose your api settings. See below for all available settings.',
+    help='Choose your api settings. See below for all available settings. '
+         'Repeat this option to make the same call for multiple settings at once.',
     envvar="CLACK_ENV",
+    multiple=True,
+)
+@click.option(
+    '--env-glob',
+    metavar="PATTERN",
+    help='Make the same call for all api settings with a name matching the pattern, e.g. "ms1-*".',
+    envvar="CLACK_ENV_GLOB",
 )
 @click.option(
     '--api', '-a',
@@ -98,17 +112,133 @@ def clack():
     type=click.Choice(['delete', 'get', 'post', 'put']),
 )
 @click.option(
-    '--csv-file', '-c',
-    help="Provide a CSV file to make a batch call. Check the README for more information. "
-         "on making batch calls.",
-    type=click.Path(readable=True, dir_okay=False, resolve_path=True),
-    metavar="CSV_FILE",
+    '--csv-file', '--input-file', '-c',
+    help="Provide a CSV, TSV or JSONL file to make a batch call. The file may be compressed with gzip, bzip2 "
+         "or xz. Use - to read from stdin. Check the README for more information on making batch calls.",
+    type=click.Path(readable=True, dir_okay=False, resolve_path=True, allow_dash=True),
+    metavar="INPUT_FILE",
+)
+@click.option(
+    '--input-format',
+    help="The format of the input file. Default: based on the file extension, csv for other files and stdin.",
+    type=click.Choice(INPUT_FORMATS),
+)
+@click.option(
+    '--upload-file',
+    help="Upload a media file after a */create call of the ms1 api. In batch calls placeholders like "
+         "<<file>> are replaced by values of the row, so every row uploads its own file. Interrupted uploads "
+         "continue where they stopped when the call is made again.",
+    metavar="FILE",
+)
+@click.option(
+    '--workers', '-w',
+    help="The maximum number of concurrent calls in a batch. Clack starts with --min-workers concurrent "
+         "calls and adjusts the number to the latency and errors of the API. Default: 1",
+    metavar="N",
+    type=click.IntRange(min=1),
+    default=1,
+    envvar="CLACK_WORKERS",
+)
+@click.option(
+    '--min-workers',
+    help="The minimum number of concurrent calls in a batch. Default: 1",
+    metavar="N",
+    type=click.IntRange(min=1),
+    default=1,
+    envvar="CLACK_MIN_WORKERS",
+)
+@click.option(
+    '--processes',
+    help="Split the input file of a batch in shards and make the calls of every shard in its own process, "
+         "with its own --workers. Needs an uncompressed input file and a platform that can fork processes, "
+         "otherwise all calls are made by a single process. The metrics of the workers are added when they are "
+         "done; their in flight calls and concurrency limit are not reported. Default: 1",
+    metavar="N",
+    type=click.IntRange(min=1),
+    default=1,
+    envvar="CLACK_PROCESSES",
+)
+@click.option(
+    '--breaker-threshold',
+    help="Pause a batch after this number of calls in a row failed, because the host was unavailable "
+         "(connection errors and 5xx responses). Set to 0 to never pause. Default: 10",
+    metavar="N",
+    type=click.IntRange(min=0),
+    default=10,
+    envvar="CLACK_BREAKER_THRESHOLD",
+)
+@click.option(
+    '--breaker-cooldown',
+    help="The number of seconds a batch is paused before a single call checks if the host is available "
+         "again. The pause doubles every time the check fails. Default: 30",
+    metavar="SECONDS",
+    type=click.IntRange(min=1),
+    default=30,
+    envvar="CLACK_BREAKER_COOLDOWN",
+)
+@click.option(
+    '--dry-run',
+    help="Don't make any calls, but output the endpoint and params of every call that would be made.",
+    is_flag=True,
+)
+@click.option(
+    '--job-db',
+    help="Store the input, status, latency and (filtered) response of every call of a batch in a SQLite "
+         "database, instead of keeping all results in memory. Only a summary is printed.",
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    metavar="DB_FILE",
+)
+@click.option(
+    '--lease-dir',
+    help="Make a batch call together with clack instances on other hosts. The calls are divided through "
+         "lease files in this directory on a shared filesystem. Results are combined with \"clack batch merge\".",
+    type=click.Path(file_okay=False, writable=True, resolve_path=True),
+    metavar="DIR",
+)
+@click.option(
+    '--lease-ttl',
+    help="The number of seconds after which the lease of a chunk of an instance that stopped is taken "
+         "over by another instance. Default: 300",
+    metavar="SECONDS",
+    type=click.IntRange(min=1),
+    default=300,
+    envvar="CLACK_LEASE_TTL",
+)
+@click.option(
+    '--retry-failed',
+    help="Make a batch call for all failed calls of the previous job in the --job-db.",
+    is_flag=True,
 )
 @click.option(
     '--filter-response', '-f',
     help="Filter api response for a specific value. Use dotted notation for index. E.g. videos.0.key "
          "for the first key from a list of videos. You can also use videos.*.key, to get all keys for "
-         "all videos in the list or use and empty string to get everything.",
+         "all videos in the list or use and empty string to get everything. End with {key,title} to get only "
+         "those values, e.g. videos.*.{key,title,duration}.",
+    metavar="INDEX",
+)
+@click.option(
+    '--pipe-to',
+    help="Make a follow up call to this endpoint for every item in the filtered response of the call. "
+         "The --filter-response must result in a list of items, e.g. videos.*.key. "
+         "Use <<item>> in --pipe-params to insert an item.",
+    metavar="ENDPOINT",
+)
+@click.option(
+    '--pipe-params',
+    help="The params template for the follow up calls of --pipe-to, e.g. \"{'video_key': '<<item>>'}\". "
+         "If the items are dicts, their keys can be used as well, e.g. <<key>>.",
+    metavar="PARAMS",
+)
+@click.option(
+    '--pipe-method',
+    help="Set the HTTP method/verb of the follow up calls of --pipe-to (only ac2). "
+         "The follow up calls use --method if this isn't given.",
+    type=click.Choice(['delete', 'get', 'post', 'put']),
+)
+@click.option(
+    '--pipe-filter',
+    help="Filter the responses of the follow up calls of --pipe-to. Works like --filter-response.",
     metavar="INDEX",
 )
 @click.option(
@@ -131,10 +261,18 @@ def clack():
 )
 @click.option(
     '--output', '-o',
-    help="Choose the output format",
+    help="Choose the output format. With csv and tsv every item of the (filtered) response is written as a row, "
+         "as soon as it arrives.",
     envvar='FORMAT',
     type=click.Choice(COMMON_SETTINGS['output']['options']),
 )
+@click.option(
+    '--output-file',
+    help="Write the csv or tsv rows to this file instead of stdout.",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="CLACK_OUTPUT_FILE",
+    metavar="FILE",
+)
 @click.option(
     '--verbosity', '-v',
     help="Verbose output is the default terminal output and clack is quiet with non terminal output. "
@@ -157,15 +295,308 @@ def clack():
     is_flag=True,
     envvar="CLACK_NO_FORMATTING",
 )
+@click.option(
+    '--watch',
+    help="Make the call again every number of seconds and only output the changes in the (filtered) response.",
+    type=click.FloatRange(min=0.1),
+    metavar="SECONDS",
+)
+@click.option(
+    '--until',
+    help="Stop watching once a condition on the (filtered) response is met, "
+         "e.g. \"video.status == ready\" or \"total >= 100\".",
+    metavar="CONDITION",
+)
+@click.option(
+    '--compress-requests',
+    help="Gzip request bodies of 16 KB or more for the ac2 and adm api. Bodies are sent uncompressed "
+         "again if the server doesn't accept them.",
+    is_flag=True,
+    envvar="CLACK_COMPRESS_REQUESTS",
+)
+@click.option(
+    '--request-log',
+    help="Append an entry for every request (time, env, endpoint, params hash, status, latency and bytes, "
+         "compressed and uncompressed) to a JSON lines file.",
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    metavar="LOG_FILE",
+    envvar="CLACK_REQUEST_LOG",
+)
+@click.option(
+    '--metrics-file',
+    help="Write metrics of all requests in the Prometheus text format to this file, every 10 seconds and when "
+         "clack is done. Use a path of the textfile collector of the node exporter.",
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    metavar="PROM_FILE",
+    envvar="CLACK_METRICS_FILE",
+)
+@click.option(
+    '--metrics-port',
+    help="Serve metrics of all requests in the Prometheus text format on this port of localhost while clack runs.",
+    type=click.IntRange(min=1, max=65535),
+    metavar="PORT",
+    envvar="CLACK_METRICS_PORT",
+)
+@click.option(
+    '--record',
+    help="Record all requests and their responses (including status and headers) to a cassette file.",
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    metavar="CASSETTE",
+)
+@click.option(
+    '--replay',
+    help="Replay the responses from a recorded cassette file instead of calling the API.",
+    type=click.Path(exists=True, dir_okay=False, readable=True, resolve_path=True),
+    metavar="CASSETTE",
+)
+@click.option(
+    '--cache',
+    help="Cache the responses of read only calls (ac2 get calls and ms1 list and show calls) on disk.",
+    is_flag=True,
+    envvar="CLACK_CACHE",
+)
+@click.option(
+    '--cache-ttl',
+    help="The number of seconds a cached response is used before it is revalidated. Default: 300",
+    metavar="SECONDS",
+    type=click.IntRange(min=0),
+    default=300,
+    envvar="CLACK_CACHE_TTL",
+)
 @click.argument('apicall', required=True)
 @click.argument('params', required=False)
 def call(apicall=None, params=None, *args, **kwargs):
     env.init(command="call", *args, **kwargs)
+    if env.options.output_file and env.output not in TABLE_OUTPUTS:
+        return env.abort("--output-file can only be used with --output csv or tsv.")
+    if params == '-':
+        if env.options.csv_file == '-':
+            return env.abort("The params and the input file cannot both be read from stdin.")
+        params = click.get_text_stream('stdin').read()
+    names = CallCommands.env_names(env)
+    if len(names) > 1:
+        return CallCommands.call_envs(env, names, apicall, params)
     return CallCommands(env).call(apicall, params)
 
 clack.add_command(call)
 
 
+# CLACK - Batch ###############################################################
+
+@click.group(
+    'batch',
+    cls=AliasedGroup,
+    help="Manage batch calls that are made by multiple instances.",
+    epilog="Use \"clack batch COMMAND --help\" for help with subcommands.\n"
+)
+def batch_group(*args, **kwargs):
+    pass
+
+clack.add_command(batch_group)
+
+
+@click.command('merge', help="Combine the results of all instances of a batch call made with --lease-dir.")
+@click.argument(
+    'lease_dir',
+    metavar='DIR',
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+)
+@click.option(
+    '--job-db',
+    help="Store the combined results in a SQLite database, instead of printing them. Only a summary is printed.",
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    metavar="DB_FILE",
+)
+@click.option(
+    '--output', '-o',
+    help="Choose the output format. With csv and tsv every item of the (filtered) response is written as a row, "
+         "as soon as it arrives.",
+    envvar='FORMAT',
+    type=click.Choice(COMMON_SETTINGS['output']['options']),
+)
+@click.option(
+    '--output-file',
+    help="Write the csv or tsv rows to this file instead of stdout.",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="CLACK_OUTPUT_FILE",
+    metavar="FILE",
+)
+@click.option(
+    '--no-formatting',
+    help="Return the results as is. No formatting to make it more readable. Also implies --no-colors",
+    is_flag=True,
+    envvar="CLACK_NO_FORMATTING",
+)
+def batch_merge(lease_dir, *args, **kwargs):
+    env.init(command="batch", *args, **kwargs)
+    if env.options.output_file and env.output not in TABLE_OUTPUTS:
+        return env.abort("--output-file can only be used with --output csv or tsv.")
+    return BatchCommands.merge(env, lease_dir)
+
+batch_group.add_command(batch_merge)
+
+
+# CLACK - Diff ################################################################
+
+@click.group(
+    'diff',
+    cls=AliasedGroup,
+    help="Compare responses of two envs or the output of two batch runs.",
+    epilog="Use \"clack diff COMMAND --help\" for help with subcommands.\n"
+)
+def diff_group(*args, **kwargs):
+    pass
+
+clack.add_command(diff_group)
+
+
+@click.command(
+    'calls',
+    help="Make the same call for two envs and show the differences between the responses. With "
+         "--filter-response the items in the filtered list are compared one by one, while the pages of "
+         "ms1 lists come in.",
+)
+@click.option(
+    '--env', '-e',
+    metavar="NAME",
+    type=click.Choice(env.sections),
+    help='The api settings to compare. Use this option twice.',
+    multiple=True,
+    required=True,
+)
+@click.option(
+    '--filter-response', '-f',
+    help="Compare the items of the list at this path, e.g. videos.*",
+    metavar="INDEX",
+)
+@click.option(
+    '--key-path',
+    help="Pair the records of both sides by the value at this path, e.g. key or video.key. "
+         "Records are paired by position if this isn't given.",
+    metavar="PATH",
+)
+@click.option(
+    '--window',
+    help="The number of records of each side that are kept while waiting for their counterpart. "
+         "Records that are further apart are reported as removed and added. Default: 10000",
+    type=click.IntRange(min=1),
+    default=10000,
+    metavar="RECORDS",
+)
+@click.option(
+    '--no-formatting',
+    help="Output the differences without colors.",
+    is_flag=True,
+    envvar="CLACK_NO_FORMATTING",
+)
+@click.argument('apicall', required=True)
+@click.argument('params', required=False)
+def diff_calls(apicall=None, params=None, *args, **kwargs):
+    env.init(command="diff", *args, **kwargs)
+    return DiffCommands.calls(env, list(env.options.env), apicall, params)
+
+diff_group.add_command(diff_calls)
+
+
+@click.command('files', help="Show the differences between two json lines files, or two files with a json array or "
+                             "object, e.g. the output of two batch runs. The items of an array are paired by "
+                             "position and those of an object by key, if --key-path isn't given. A json array or "
+                             "object is read into memory at once.")
+@click.option(
+    '--key-path',
+    help="Pair the records of both sides by the value at this path, e.g. key or video.key. "
+         "Records are paired by position if this isn't given.",
+    metavar="PATH",
+)
+@click.option(
+    '--window',
+    help="The number of records of each side that are kept while waiting for their counterpart. "
+         "Records that are further apart are reported as removed and added. Default: 10000",
+    type=click.IntRange(min=1),
+    default=10000,
+    metavar="RECORDS",
+)
+@click.option(
+    '--no-formatting',
+    help="Output the differences without colors.",
+    is_flag=True,
+    envvar="CLACK_NO_FORMATTING",
+)
+@click.argument('old', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+def diff_files(old, new, *args, **kwargs):
+    env.init(command="diff", *args, **kwargs)
+    return DiffCommands.files(env, old, new)
+
+diff_group.add_command(diff_files)
+
+
+# CLACK - Jobs ################################################################
+
+@click.group(
+    'jobs',
+    cls=AliasedGroup,
+    help="Run batch calls in the background and check on them.",
+    epilog="Use \"clack jobs COMMAND --help\" for help with subcommands.\n"
+)
+def jobs_group(*args, **kwargs):
+    pass
+
+clack.add_command(jobs_group)
+
+
+@click.command(
+    'submit',
+    help="Make a call in the background, detached from the terminal. Give the options and arguments like you "
+         "would for \"clack call\", e.g. clack jobs submit --csv-file input.csv /videos/show \"{...}\". "
+         "The output and the results (a job database) of the call are stored with the job. Secrets must be "
+         "in the keyring, because a job cannot ask for them.",
+    context_settings={'ignore_unknown_options': True, 'allow_interspersed_args': False},
+)
+@click.argument('call_args', nargs=-1, type=click.UNPROCESSED)
+def jobs_submit(call_args, *args, **kwargs):
+    env.init(command="jobs", *args, **kwargs)
+    return JobsCommands.submit(env, list(call_args))
+
+jobs_group.add_command(jobs_submit)
+
+
+@click.command('run', hidden=True)
+@click.argument('job_id')
+def jobs_run(job_id, *args, **kwargs):
+    env.init(command="jobs", *args, **kwargs)
+    return JobsCommands.run(env, job_id)
+
+jobs_group.add_command(jobs_run)
+
+
+@click.command('status', help="Show all jobs, or the progress and the calls per status code of a single job.")
+@click.argument('job_id', required=False)
+def jobs_status(job_id=None, *args, **kwargs):
+    env.init(command="jobs", *args, **kwargs)
+    return JobsCommands.status(env, job_id)
+
+jobs_group.add_command(jobs_status)
+
+
+@click.command('attach', help="Follow the output of a job until it's done. Ctrl+C detaches, the job keeps running.")
+@click.argument('job_id')
+def jobs_attach(job_id, *args, **kwargs):
+    env.init(command="jobs", *args, **kwargs)
+    return JobsCommands.attach(env, job_id)
+
+jobs_group.add_command(jobs_attach)
+
+
+@click.command('cancel', help="Stop a job. The results of the calls that were made are kept.")
+@click.argument('job_id')
+def jobs_cancel(job_id, *args, **kwargs):
+    env.init(command="jobs", *args, **kwargs)
+    return JobsCommands.cancel(env, job_id)
+
+jobs_group.add_command(jobs_cancel)
+
+
 # CLACK - Settings ############################################################
 
 @click.group(
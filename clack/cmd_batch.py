@@ -0,0 +1,42 @@
+import json
+
+from .cmd_call import CallCommands
+from .lib_lease import LeaseDir
+
+
+class BatchCommands(object):
+
+    @staticmethod
+    def _merged_results(leases, num_chunks):
+        """ Yields the outcome of every call of the chunks that are done. Only
+            the results of the instance that finished a chunk first are used.
+        """
+        done_by = dict([(chunk, leases.done_by(chunk)) for chunk in range(num_chunks)])
+        for instance, path in leases.results_paths():
+            with open(path, 'r') as fp:
+                for line in fp:
+                    try:
+                        row_result = json.loads(line)
+                    except ValueError:
+                        # The last line of an instance that stopped halfway.
+                        continue
+                    if done_by.get(row_result[0]) == instance:
+                        yield tuple(row_result[1:])
+
+    @staticmethod
+    def merge(env, lease_dir):
+        """ The merge command.
+            Invoked by: clack batch merge
+        """
+        job = LeaseDir.job(lease_dir)
+        if job is None:
+            return env.abort('{!s} is not a lease directory of a batch.'.format(lease_dir))
+        leases = LeaseDir(lease_dir)
+        status = leases.status(job['chunks'])
+        if status['done'] < job['chunks']:
+            env.echo("Only {!s} of {!s} chunks are done. The results are incomplete.".format(
+                status['done'], job['chunks'],
+            ), force=True, err=True)
+        CallCommands.output_batch(
+            env, job['endpoint'], job['params'], BatchCommands._merged_results(leases, job['chunks']),
+        )
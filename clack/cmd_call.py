@@ -1,11 +1,66 @@
-import ast
-import csv
+import atexit
+import fnmatch
+import json
 import jwplatform
-import re
+import multiprocessing
+import os
+import requests
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
 
-from environment import FIND_USERS_BY
-from lib_portal_api import PortalAPI
-from lib_portal_api import PortalAPIError
+from .environment import CACHE_MAX_SIZE
+from .environment import FIND_USERS_BY
+from .environment import FakeProgressBar
+from .environment import LEASE_CHUNK_SIZE
+from .environment import TABLE_OUTPUTS
+from .lib_cassette import Cassette
+from .lib_cassette import CassetteError
+from .lib_condition import Condition
+from .lib_condition import ConditionError
+from .lib_diff import diff
+from .lib_diff import format_change
+from .lib_batch import AIMDController
+from .lib_batch import BatchExecutor
+from .lib_batch import CircuitBreaker
+from .lib_batch import SingleFlight
+from .lib_cache import MemoryCache
+from .lib_cache import ResponseCache
+from .lib_complete import remember_endpoint
+from .lib_input import InputError
+from .lib_input import is_rereadable
+from .lib_input import is_shardable
+from .lib_input import read_rows
+from .lib_input import shard_ranges
+from .lib_jobstore import JobStore
+from .lib_metrics import Metrics
+from .lib_metrics import MetricsExporter
+from .lib_lease import LeaseDir
+from .lib_lease import LeaseError
+from .lib_portal_api import ACCEPT_ENCODING
+from .lib_portal_api import PortalAPI
+from .lib_portal_api import PortalAPIError
+from .lib_requestlog import RequestLog
+from .lib_requestlog import params_hash
+from .lib_requestlog import wire_bytes
+from .lib_status import BatchStatus
+from .lib_stream import prefetch
+from .lib_table import project
+from .lib_table import split_projection
+from .lib_template import Template
+from .lib_template import TemplateError
+from .lib_upload import ResumableUpload
+from .lib_upload import UploadError
+from .lib_upload import UploadState
+
+# Number of items requested per page when a list is fetched page by page.
+PAGE_SIZE = 1000
+
+# Calls to ms1 endpoints ending with these actions only read data.
+MS1_READ_ACTIONS = ('list', 'show')
 
 
 class CallCommands(object):
@@ -23,28 +78,55 @@ class CallCommands(object):
     # Stores site token for making botr proxy calls
     botr = None
 
+    # Records or replays requests and responses
+    cassette = None
+
+    # Caches responses of read only calls
+    cache = None
+
+    # Clients of the JW Platform API and the account API, reused for all calls
+    ms1_api = None
+    ac2_api = None
+
+    # Logs every request, shared by all instances
+    request_log = None
+
+    # Counts and times every request, shared by all instances
+    metrics = None
+
     # Calltypes
     batch = False
     call_as_user = False
     user_signature = None
 
-    @staticmethod
-    def _unicode_csv_reader(utf8_data, dialect=csv.excel, **kwargs):
-        csv_reader = csv.reader(utf8_data, dialect=dialect, **kwargs)
-        for row in csv_reader:
-            yield [unicode(cell, 'utf-8') for cell in row]
-
     @staticmethod
     def _normalize_headers(headers):
         """ Set all headers to lowercase, so it's easier to find the right one.
         """
         return dict([(key.lower(), headers[key]) for key in headers])
 
-    def __init__(self, env):
+    @staticmethod
+    def env_names(env):
+        """ Returns the names of all environments selected with --env and --env-glob.
+        """
+        names = list(env.options.env or [])
+        if env.options.env_glob:
+            names += [s for s in env.sections if fnmatch.fnmatch(s, env.options.env_glob) and s not in names]
+        return names
+
+    def __init__(self, env, name=None, secret=None):
         self.env = env
+        self.breakers = {}
+        self.breakers_lock = threading.Lock()
+        self.clients_lock = threading.Lock()
         opts = env.options
         # Get the environment name
-        name = env.default if opts.env is None else opts.env
+        if name is None:
+            names = CallCommands.env_names(env)
+            if opts.env_glob and not names:
+                return env.abort('There are no api settings that match {!s}.'.format(opts.env_glob))
+            name = names[0] if names else env.default
+        self.name = name
         # If the name is not set and there is no default we need to
         # check that all other connections params have been set.
         if name is None and (not opts.host or not opts.key or not opts.api):
@@ -58,9 +140,40 @@ class CallCommands(object):
         self.host = self.host if self.host.startswith('http') else "https://{!s}".format(self.host)
         self.verify_ssl = env.get(name, 'verify_ssl', 'yes') == 'yes'
         self.key = opts.key if opts.key else env.get(name, 'key')
-        self.secret = None if name is None else env.get_secret(name, self.key)
-        # If we don't have a secret, we need to ask for it.
-        if self.secret is None:
+        if secret is None and name is not None:
+            secret = env.get_secret(name, self.key)
+        self.secret = secret
+        # Record or replay the requests and responses of this call.
+        if opts.record and opts.replay:
+            return env.abort('You can either --record or --replay a cassette, not both.')
+        elif opts.record or opts.replay:
+            self.cassette = Cassette(opts.record or opts.replay, mode='record' if opts.record else 'replay')
+        # Log every request. All instances (for multiple envs) share the log.
+        if opts.request_log and CallCommands.request_log is None:
+            CallCommands.request_log = RequestLog(opts.request_log)
+            atexit.register(CallCommands.request_log.close)
+        # Export metrics of all requests. All instances share the metrics.
+        if (opts.metrics_file or opts.metrics_port) and CallCommands.metrics is None:
+            CallCommands.metrics = Metrics()
+            try:
+                exporter = MetricsExporter(CallCommands.metrics, path=opts.metrics_file, port=opts.metrics_port)
+            except OSError as e:
+                return env.abort('The metrics cannot be served on port {!s}: {!s}'.format(
+                    opts.metrics_port, e.strerror or e,
+                ))
+            atexit.register(exporter.close)
+        # Cache the responses of read only calls.
+        if opts.cache:
+            self.cache = ResponseCache(
+                env.cache_path(),
+                namespace="{!s}".format(name),
+                ttl=opts.cache_ttl,
+                max_size=CACHE_MAX_SIZE,
+            )
+        # If we don't have a secret, we need to ask for it. Replayed calls never authenticate.
+        if self.cassette is not None and self.cassette.replaying:
+            self.secret = self.secret or ''
+        elif self.secret is None:
             self.secret = env.input('Enter your password/secret', hide_input=True)
         # Api type specific settings.
         if self.api == 'ms1':
@@ -75,13 +188,18 @@ class CallCommands(object):
             ('verify ssl', self.verify_ssl if self.host.startswith('https://') else None),
             ('endpoint', endpoint),
             ('request method', None if self.api == 'ms1' else self.method),
-            ('params', params_str),
+            ('params', params_str if params_str is None or len(params_str) <= 200 else params_str[:200] + '...'),
             ('key/username', self.key),
             ('secret', '********'),
             ('output format', self.output_format),
-            ('batch csv file', self.env.options.csv_file),
+            ('batch input file', self.env.options.csv_file),
+            ('upload file', self.env.options.upload_file),
+            ('input format', self.env.options.input_format),
             ('calling as user', self.env.options.as_user),
             ('find user by', self.env.options.find_user_by if self.env.options.as_user else None),
+            ('recording to', self.env.options.record),
+            ('replaying from', self.env.options.replay),
+            ('cache ttl', self.env.options.cache_ttl if self.cache else None),
         ]
         # Filter out None values and return
         return [c for c in config if c[1] is not None]
@@ -91,38 +209,37 @@ class CallCommands(object):
         """
         if params is not None:
             try:
-                params = ast.literal_eval(params)
-            except:
+                params = Template(params).parse()
+            except TemplateError as e:
+                if params.startswith('@'):
+                    return self.env.abort(e.message)
                 return self.env.abort(
                     "The params could not be parsed. Please make sure they are in the right "
                     "format, e.g.: \"{'test': True, 'foo': 'bar'}\""
                 )
+        return self._add_site_token(params)
+
+    def _add_site_token(self, params):
+        """ Add the site token to the params for calls through the botr proxy.
+        """
         if self.botr and params is None:
             params = {'site_token': self.botr}
         elif self.botr:
             params['site_token'] = self.botr
         return params
 
-    def _call_adm(self, endpoint, params):
-        if not self.env.has_vpn_access():
+    def _call_adm(self, endpoint, params, method=None):
+        replaying = self.cassette is not None and self.cassette.replaying
+        if not replaying and not self.env.has_vpn_access():
             self.env.abort('No VPN Access: Please connect to the VPN first and try again.')
-        return self._call_ac2(endpoint, params, admin=True)
-
-    def _call_ac2(self, endpoint, params, admin=False):
-        """ Call the JW Player account API and output the response.
-        """
-        # Set the endpoint
-        # Initiate the Portal API.
-        ac2_api = PortalAPI(
-            username=self.key,
-            password=self.secret,
-            api_url=self.host,
-            is_admin=admin,
-            signature=self.user_signature,
-            verify=self.verify_ssl,
-        )
+        return self._call_ac2(endpoint, params, admin=True, method=method)
+
+    def _call_ac2(self, endpoint, params, admin=False, method=None):
+        """ Call the JW Player account API and output the response. The call
+            is made with the --method, unless another `method` is given.
+        """
         # Get the method.
-        method = getattr(ac2_api, self.method)
+        method = getattr(self._ac2_client(admin), method or self.method)
         try:
             resp = method(endpoint, params=params, raw_response=True)
             if resp.status_code == 200:
@@ -131,22 +248,137 @@ class CallCommands(object):
         except PortalAPIError as e:
             return False, e
 
+    def _record_request(self, method, url, status, latency, num_bytes, **fields):
+        """ Add a request to the --request-log and the metrics, if they're enabled.
+        """
+        if self.request_log is not None:
+            self.request_log.log(method, url, status, latency, num_bytes, env=self.name, api=self.api, **fields)
+        if self.metrics is not None:
+            self.metrics.observe_request(self.api, self.name, method, status, latency, num_bytes,
+                                         attempt=fields.get('attempt', 0), wire_bytes=fields.get('wire_bytes'))
+
+    def _ms1_client(self):
+        """ Returns the client of the JW Platform API. The client is created
+            once, so its connections are kept open between calls.
+        """
+        with self.clients_lock:
+            if self.ms1_api is None:
+                protocol, host = 'https', self.host
+                if host.startswith('http'):
+                    protocol, host = host.split('://')
+                self.ms1_api = jwplatform.Client(self.key, self.secret, host=host, scheme=protocol, agent='clack')
+                self.ms1_api._connection.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        return self.ms1_api
+
+    def _ac2_client(self, admin=False):
+        """ Returns the client of the account API. The client is created once
+            and shared by all workers, so a session is started only once.
+        """
+        with self.clients_lock:
+            if self.ac2_api is None:
+                self.ac2_api = PortalAPI(
+                    username=self.key,
+                    password=self.secret,
+                    api_url=self.host,
+                    is_admin=admin,
+                    signature=self.user_signature,
+                    verify=self.verify_ssl,
+                    cassette=self.cassette,
+                    cache=self.cache,
+                    request_log=self._record_request,
+                    pool_size=max(self.env.options.workers or 1, 10),
+                    compress_requests=self.env.options.compress_requests,
+                )
+        return self.ac2_api
+
     def _call_ms1(self, endpoint, params=None):
         """ Call the JW Platform API and output the response
         """
-        protocol = 'https'
-        if self.host.startswith('http'):
-            protocol, self.host = self.host.split('://')
-        ms1_api = jwplatform.Client(self.key, self.secret, host=self.host, scheme=protocol, agent='clack')
+        ms1_api = self._ms1_client()
+        # The request is built and sent here instead of through the resources of
+        # the client, so the full response (status and headers) is available.
+        url, signed_params = ms1_api._build_request('/{!s}'.format(endpoint), params)
+        info = Cassette.request_info('ms1', 'GET', url, params=params)
+
+        def request(conditional):
+            started = time.time()
+            status, num_bytes, fields = 0, 0, {}
+            try:
+                resp = ms1_api._connection.request('GET', url, params=signed_params, headers=conditional)
+                status, num_bytes = resp.status_code, len(resp.content)
+                fields['wire_bytes'] = wire_bytes(resp)
+                return resp
+            finally:
+                self._record_request('GET', url, status, time.time() - started, num_bytes,
+                                     params_hash=params_hash(params), **fields)
+
+        def send(conditional=None):
+            if self.cassette is not None:
+                return self.cassette.request(lambda: request(conditional), info)
+            return request(conditional)
         try:
-            resp = getattr(ms1_api, endpoint.replace('/', '.'))(**params)
-            return True, resp
-        except jwplatform.errors.JWPlatformError as e:
+            if self.cache is not None and self._is_read_only(endpoint):
+                resp = self.cache.request(send, info, scope=self.key)
+            else:
+                resp = send()
+        except CassetteError as e:
+            return False, jwplatform.errors.JWPlatformError(e.message)
+        try:
+            data = resp.json()
+        except ValueError:
+            return False, jwplatform.errors.JWPlatformUnknownError('Not a valid JSON string: {!s}'.format(resp.text))
+        if resp.status_code != 200:
+            error = jwplatform.errors.JWPlatformError(data.get('message', resp.text))
+            error.status_code = resp.status_code
+            return False, error
+        return True, data
+
+    def _upload(self, call_method, endpoint, params, path, progress=False):
+        """ Create a video with a */create call of the ms1 api and upload the
+            file at `path` to it. An upload that was interrupted continues
+            where it stopped, without creating another video.
+        """
+        try:
+            state = UploadState(self.env.upload_state_path(), path)
+        except OSError as e:
+            return False, UploadError('Cannot upload {!s}: {!s}'.format(path, e.strerror))
+        if state.data.get('endpoint') != endpoint:
+            success, resp = call_method(endpoint, dict(params or {}, resumable='true'))
+            if not success:
+                return False, resp
+            if 'link' not in resp:
+                return False, UploadError('The response of {!s} has no upload link.'.format(endpoint))
+            state.remove()
+            state.save(endpoint=endpoint, link=resp['link'], video=resp.get('video'),
+                       session_id=uuid.uuid4().hex, offset=0)
+        upload = ResumableUpload(path, state.data['link'], state.data['session_id'], offset=state.data['offset'],
+                                 verify=self.verify_ssl, log=self._record_request)
+        label = 'Uploading {!s}'.format(os.path.basename(path))
+        progressbar = self.env.progressbar if progress else lambda iterable, **kwargs: FakeProgressBar(iterable)
+        try:
+            with progressbar(upload.chunks(), length=upload.num_chunks, label=label) as bar:
+                for offset in bar:
+                    state.save(offset=offset)
+                    bar.update(1)
+        except UploadError as e:
+            # The upload session is gone, so the next attempt starts over.
+            if 400 <= e.status_code < 500:
+                state.remove()
             return False, e
+        video = state.data.get('video')
+        state.remove()
+        return True, {'status': 'ok', 'video': video, 'upload': upload.result}
+
+    def _uploader(self, call_method, path, progress=False):
+        """ Returns a call method that makes a */create call followed by the
+            upload of the file at `path`.
+        """
+        return lambda endpoint, params: self._upload(call_method, endpoint, params, path, progress=progress)
 
     def _setup_call_as_user(self, endpoint, params_str=None):
         admin_api = PortalAPI(username=self.key, password=self.secret, api_url=self.host,
-                              is_admin=True, verify=self.verify_ssl)
+                              is_admin=True, verify=self.verify_ssl, cassette=self.cassette,
+                              request_log=self._record_request)
         resp = admin_api.get(
             'v2/admin/accounts',
             params={FIND_USERS_BY[self.env.options.find_user_by]['search_param']: self.env.options.as_user},
@@ -231,15 +463,17 @@ class CallCommands(object):
         self.env.options.as_user = None
         return self.call(endpoint, params_str)
 
-    def _filter_response(self, resp, keymap=None):
+    def _filter_response(self, resp, keymap=None, path=None):
         """ Filter the return value(s) from the response.
         """
+        path = self.env.options.filter_response if path is None else path
         # Exceptional case:
-        if self.env.options.filter_response == "":
+        if path == "":
             return resp
         # Cleanup keymap and find integers
         if keymap is None:
-            keymap = self.env.options.filter_response.split(".")
+            path, columns = split_projection(path)
+            keymap = path.split(".") if path else []
             for i, key in enumerate(keymap):
                 try:
                     intval = int(key)
@@ -247,21 +481,36 @@ class CallCommands(object):
                         keymap[i] = intval
                 except ValueError:
                     continue
+            # A projection like {key,title} picks the columns of the value.
+            if columns is not None:
+                keymap.append(tuple(columns))
         # Find the return value
         for i, key in enumerate(keymap, start=1):
-            if key == "*" and isinstance(resp, (list, tuple)):
-                return [self._filter_response(j, keymap=keymap[i:]) for j in resp]
-            elif isinstance(key, basestring) and isinstance(resp, dict) and resp.get(key) is not None:
+            if isinstance(key, tuple):
+                return project(resp, key)
+            elif key == "*" and isinstance(resp, (list, tuple)):
+                return [self._filter_response(j, keymap=keymap[i:], path=path) for j in resp]
+            elif isinstance(key, str) and isinstance(resp, dict) and resp.get(key) is not None:
                 resp = resp.get(key)
             elif isinstance(key, int) and isinstance(resp, (list, tuple)) and len(resp) > key:
                 resp = resp[key]
             else:
                 return "Error filtering {} at {}".format(
-                    ".".join(["{!s}".format(j) for j in keymap]),
+                    path,
                     ".".join(["{!s}".format(j) for j in keymap[:i]])
                 )
         return resp
 
+    @staticmethod
+    def _error_message(resp):
+        """ Returns a readable error message for a failed call.
+        """
+        if hasattr(resp, 'code') and hasattr(resp, 'message'):
+            return "{!s}: {!s}".format(resp.code, resp.message)
+        elif hasattr(resp, 'content'):
+            return resp.text if resp.content else "Clack: No response content."
+        return "{!s}".format(resp)
+
     def _single_call(self, call_method, endpoint, params_str):
         params = self._parse_params(params_str)
         success, resp = call_method(endpoint, params)
@@ -282,56 +531,627 @@ class CallCommands(object):
             self.env.echo("Error response:", style='error', err=True)
             if hasattr(resp, 'status_code'):
                 self.env.echo(self.env.colorize(self.env.create_table({'status code': resp.status_code})))
-            if hasattr(resp, 'code') and hasattr(resp, 'message'):
-                resp = "{!s}: {!s}".format(resp.code, resp.message)
-            elif hasattr(resp, 'content'):
-                resp = resp.content if resp.content else "Clack: No response content."
-            self.env.echo("{!s}".format(resp), err=True)
+            self.env.echo(CallCommands._error_message(resp), err=True)
         return None
 
-    def _batch_call(self, call_method, endpoint, params_str):
-        # Get the number of rows in the csv file. We need that for the progressbar.
-        num_rows = sum(1 for line in open(self.env.options.csv_file, 'r')) - 1 if self.env.verbose else 1
-        # Now let's process that CSV file.
-        table = CallCommands._unicode_csv_reader(open(self.env.options.csv_file, 'r'))
-        header_row, results = None, {}
-        with self.env.progressbar(table, length=num_rows, label='Calling API') as bar:
-            for columns in bar:
-                if header_row is None:
-                    header_row = columns
-                    continue
-                values = {}
-                for i, val in enumerate(columns):
-                    values[header_row[i]] = val
-                call_params = params_str
-                for search_for, name in re.findall(r'(<<(\w+)>>)', params_str):
-                    call_params = params_str.replace(search_for, values.get(name))
-                call_params = self._parse_params(call_params)
-                call_endpoint = endpoint
-                for search_for, name in re.findall(r'(<<(\w+)>>)', endpoint):
-                    call_endpoint = (endpoint.replace(search_for, values.get(name))).strip('/ ')
-                success, resp = call_method(call_endpoint, call_params)
-                if success and self.env.options.filter_response:
-                    results[columns[0]] = self._filter_response(resp)
-                elif success:
-                    results[columns[0]] = "success"
-                else:
-                    results[columns[0]] = "Error: {!s}".format(resp)
-                bar.update(1)
+    def _table_call(self, call_method, endpoint, params_str):
+        """ Write the items of the filtered response as rows of a csv or tsv
+            file. All pages of ms1 lists are fetched and their rows are written
+            while the next page comes in.
+        """
+        table = self.env.table()
+        for item in prefetch(self._paged_items(call_method, endpoint, self._parse_params(params_str))):
+            table.writerow(item)
+        table.flush()
+        self.env.echo("{!s} rows were written.".format(table.num_rows), err=True)
+
+    def _env_call(self, endpoint, params_str, results):
+        """ Make a single call for this environment and store the (filtered)
+            response in `results` under the name of the environment.
+        """
+        endpoint = self._prepare_endpoint(endpoint)
+        call_method = getattr(self, '_call_{!s}'.format(self.api))
+        try:
+            success, resp = call_method(endpoint, self._parse_params(params_str))
+        except requests.RequestException as e:
+            success, resp = False, e
+        if success:
+            if hasattr(resp, 'json'):
+                resp = resp.json()
+            results[self.name] = self._filter_response(resp) if self.env.options.filter_response else resp
+        else:
+            results[self.name] = "Error: {!s}".format(CallCommands._error_message(resp))
+
+    @staticmethod
+    def env_commands(env, names):
+        """ Returns call commands for the environments `names`. All secrets are
+            fetched before any call is made.
+        """
+        for name in names:
+            if not env.config.has_section(name):
+                return env.abort('The env {!s} does not exist.'.format(name))
+        secrets = {}
+        for name in names:
+            key = env.get(name, 'key')
+            secrets[name] = env.get_secret(name, key)
+            if secrets[name] is None and not env.options.replay:
+                secrets[name] = env.input('Enter your password/secret for {!s}'.format(name), hide_input=True)
+        return [CallCommands(env, name=name, secret=secrets[name]) for name in names]
+
+    @staticmethod
+    def call_envs(env, names, endpoint, params_str):
+        """ Make the same call for multiple environments at once.
+            Invoked by: clack call --env NAME --env NAME
+        """
+        # Options for a single env, a batch, pipeline or watch, or a cassette.
+        options = [
+            ('--as-user', env.options.as_user),
+            ('--csv-file', env.options.csv_file),
+            ('--dry-run', env.options.dry_run),
+            ('--watch', env.options.watch),
+            ('--pipe-to', env.options.pipe_to),
+            ('--retry-failed', env.options.retry_failed),
+            ('--upload-file', env.options.upload_file),
+            # The requests of different envs can be identical, so the order of their responses is ambiguous.
+            ('--record', env.options.record),
+            ('--replay', env.options.replay),
+        ]
+        given = [option for option, value in options if value]
+        if given:
+            return env.abort('Calls for multiple envs cannot be combined with {!s}.'.format(", ".join(given)))
+        commands = CallCommands.env_commands(env, names)
+        env.echo("Calling {!s} on: {!s}".format(endpoint, ", ".join(names)), style='heading')
+        results = {}
+        threads = [threading.Thread(target=c._env_call, args=(endpoint, params_str, results)) for c in commands]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        env.echo("Call output: ", style='heading')
+        env.output_response(results)
+
+    def _input_rows(self, byte_range=None):
+        """ Yields a key and a dict with values for every row in the input file.
+        """
+        try:
+            for row in read_rows(self.env.options.csv_file, self.env.options.input_format, byte_range):
+                yield row
+        except (InputError, IOError) as e:
+            self.env.abort("Could not read the input file: {!s}".format(e))
+
+    def _paged_items(self, call_method, endpoint, params):
+        """ Yields the filtered items of a call. Lists of the ms1 api are fetched
+            page by page, so items are available before the last page arrives.
+        """
+        params = dict(params or {})
+        paged = self.api == 'ms1' and endpoint.endswith('/list')
+        if paged:
+            params.setdefault('result_limit', PAGE_SIZE)
+            params.setdefault('result_offset', 0)
+        while True:
+            success, resp = call_method(endpoint, dict(params))
+            if not success:
+                self.env.abort('The call of {!s} failed: {!s}'.format(
+                    endpoint, CallCommands._error_message(resp)
+                ))
+            if hasattr(resp, 'json'):
+                resp = resp.json()
+            items = self._filter_response(resp)
+            if not isinstance(items, list):
+                self.env.abort('The filtered response of {!s} is not a list: {!s}'.format(endpoint, items))
+            for item in items:
+                yield item
+            if not paged or len(items) < int(params['result_limit']):
+                return
+            params['result_offset'] = int(params['result_offset']) + len(items)
+
+    @staticmethod
+    def _item_rows(items):
+        """ Yields a key and a dict with values for every item. Items that are
+            dicts can be used with the names of their keys, all items can be
+            used as <<item>>.
+        """
+        for i, item in enumerate(items):
+            values = dict(item) if isinstance(item, dict) else {}
+            values['item'] = item
+            yield (i if isinstance(item, (dict, list)) else item), values
+
+    def _pipe_call(self, call_method, endpoint, params_str):
+        """ Make a call and a follow up call for every item of its filtered
+            response. Follow up calls are made while the pages of the first
+            call are still coming in.
+        """
+        if '*' not in (self.env.options.filter_response or '').split('.'):
+            return self.env.abort('A pipeline needs a --filter-response with a list of items, e.g. videos.*.key')
+        pipe_method = self.env.options.pipe_method
+        if pipe_method and self.api == 'ms1':
+            return self.env.abort('--pipe-method can only be used with the ac2 and adm apis.')
+        items = prefetch(self._paged_items(call_method, endpoint, self._parse_params(params_str)))
+        pipe_endpoint = self._prepare_endpoint(self.env.options.pipe_to)
+        return self._batch_call(
+            (lambda e, p: call_method(e, p, method=pipe_method)) if pipe_method else call_method,
+            pipe_endpoint,
+            self.env.options.pipe_params,
+            CallCommands._item_rows(items),
+            filter_path=self.env.options.pipe_filter,
+            method=pipe_method,
+        )
+
+    @staticmethod
+    def _status(success, resp):
+        """ Returns the HTTP status code of a call, or 0 if there is none.
+        """
+        status = getattr(resp, 'status_code', 200 if success else 0)
+        return status if isinstance(status, int) else 0
+
+    def _preflight(self, endpoint, params_str, rows):
+        """ Check all rows of a batch before any call is made. Reports every
+            row with missing values, params that cannot be parsed, an invalid
+            endpoint or a missing upload file and aborts if there are any.
+        """
+        endpoint_template, params_template = Template(endpoint), Template(params_str)
+        upload_template = Template(self.env.options.upload_file or '')
+        num_rows, num_invalid = 0, 0
+        for key, values in rows:
+            num_rows += 1
+            errors = []
+            missing = sorted(set(
+                endpoint_template.missing(values) + params_template.missing(values) + upload_template.missing(values)
+            ))
+            if missing:
+                errors.append("missing value(s) for: {!s}".format(", ".join(missing)))
+            else:
+                for check in (endpoint_template.endpoint, params_template.expand):
+                    try:
+                        check(values)
+                    except TemplateError as e:
+                        errors.append(e.message)
+                if self.env.options.upload_file and not os.path.isfile(upload_template.render(values)):
+                    errors.append("upload file not found: {!s}".format(upload_template.render(values)))
+            if errors:
+                num_invalid += 1
+                self.env.echo("Row {!s} ({!s}): {!s}".format(num_rows, key, "; ".join(errors)), force=True, err=True)
+        if num_invalid:
+            return self.env.abort("{!s} of {!s} rows are invalid. No calls have been made.".format(
+                num_invalid, num_rows,
+            ))
+        return num_rows
+
+    def _dry_run(self, endpoint, params_str, rows):
+        """ Output the requests of a batch without making them, one json
+            document per line.
+        """
+        endpoint_template, params_template = Template(endpoint), Template(params_str)
+        for key, values in rows:
+            try:
+                request = {
+                    'key': key,
+                    'endpoint': endpoint_template.endpoint(values),
+                    'params': self._add_site_token(params_template.expand(values)),
+                }
+            except TemplateError as e:
+                return self.env.abort(e.message)
+            self.env.echo(json.dumps(request, sort_keys=True, default=lambda o: "{!s}".format(o)), force=True)
+
+    def _is_read_only(self, endpoint, method=None):
+        """ Returns True if a call to `endpoint` with the --method (or `method`)
+            doesn't change anything.
+        """
+        if self.api == 'ms1':
+            return endpoint.split('/')[-1] in MS1_READ_ACTIONS
+        return (method or self.method) == 'get'
+
+    def _execute(self, call_method, endpoint, params):
+        """ Make a call and return whether it succeeded, the status code and the
+            decoded response (or the error).
+        """
+        try:
+            success, resp = call_method(endpoint, params)
+        except requests.RequestException as e:
+            return False, 0, e
+        status = CallCommands._status(success, resp)
+        if success and hasattr(resp, 'json'):
+            resp = resp.json()
+        return success, status, resp
+
+    @staticmethod
+    def _is_host_failure(status):
+        """ Returns True if a call failed, because the host is unavailable.
+        """
+        return status == 0 or status >= 500
+
+    def _breaker(self, host):
+        """ Returns the circuit breaker for `host`, or None if the circuit
+            breakers are disabled.
+        """
+        if not self.env.options.breaker_threshold:
+            return None
+        with self.breakers_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(
+                    host,
+                    threshold=self.env.options.breaker_threshold,
+                    cooldown=self.env.options.breaker_cooldown,
+                    log=lambda msg: self.env.echo(msg, force=True, err=True),
+                )
+            return self.breakers[host]
+
+    def _guarded_execute(self, call_method, endpoint, params):
+        """ Execute a call, unless the circuit breaker of the host is open. In
+            that case wait until the host may be called again.
+        """
+        breaker = self._breaker(self.host)
+        if breaker is None:
+            return self._execute(call_method, endpoint, params)
+        breaker.before()
+        result = self._execute(call_method, endpoint, params)
+        breaker.after(CallCommands._is_host_failure(result[1]))
+        return result
+
+    @staticmethod
+    def _flight_key(endpoint, params):
+        """ Returns the key of a call, which is the same for identical calls.
+            Params can hold values that json can't encode, like sets, bytes or
+            keys that are tuples or of mixed types.
+        """
+        try:
+            return json.dumps([endpoint, params], sort_keys=True, default=repr)
+        except TypeError:
+            return repr([endpoint, params])
+
+    @staticmethod
+    def _is_throttled(row_result):
+        """ Returns True if the API could not keep up with a call of a batch.
+        """
+        status = row_result[4]
+        return status == 0 or status == 429 or status >= 500
+
+    def _batch_results(self, call_method, endpoint, params_str, rows, flights=None, num_rows=None,
+                       filter_path=None, progress=True):
+        """ Makes the calls of a batch and yields the outcome of every row in
+            the order in which the calls finish.
+        """
+        endpoint_template, params_template = Template(endpoint), Template(params_str)
+        upload_template = Template(self.env.options.upload_file) if self.env.options.upload_file else None
+
+        def call_row(row):
+            key, values = row
+            row_method = call_method
+            try:
+                missing = sorted(set(endpoint_template.missing(values) + params_template.missing(values)))
+                if missing:
+                    raise TemplateError("missing value(s) for: {!s}".format(", ".join(missing)))
+                call_endpoint = endpoint_template.endpoint(values)
+                call_params = self._add_site_token(params_template.expand(values))
+                if upload_template is not None:
+                    row_method = self._uploader(call_method, upload_template.render(values))
+            except TemplateError as e:
+                return key, values, endpoint_template.render(values), None, -1, "Error: {!s}".format(e), 0.0
+            started = time.time()
+            if flights is not None:
+                success, status, resp = flights.do(
+                    CallCommands._flight_key(call_endpoint, call_params),
+                    lambda: self._guarded_execute(row_method, call_endpoint, call_params),
+                    keep=lambda result: result[0],
+                )
+            else:
+                success, status, resp = self._guarded_execute(row_method, call_endpoint, call_params)
+            latency = time.time() - started
+            if success and filter_path:
+                result = self._filter_response(resp, path=filter_path)
+            elif success:
+                result = "success"
+            else:
+                result = "Error: {!s}".format(resp)
+            return key, values, call_endpoint, call_params, status, result, latency
+
+        # The number of concurrent calls is adjusted to the latency and errors of the API.
+        controller = AIMDController(
+            min_limit=self.env.options.min_workers or 1,
+            max_limit=self.env.options.workers or 1,
+            log=lambda msg: self.env.echo(msg, err=True),
+        )
+        executor = BatchExecutor(call_row, controller, is_throttled=CallCommands._is_throttled)
+        if self.metrics is not None:
+            self.metrics.gauge('clack_in_flight_calls', lambda: controller.in_flight)
+            self.metrics.gauge('clack_concurrency_limit', lambda: controller.limit)
+        if not progress:
+            for row_result in executor.map(rows):
+                yield row_result
+            return
+        # The status line is redrawn by its own thread, not for every call.
+        status = BatchStatus(
+            total=num_rows,
+            in_flight=lambda: controller.in_flight,
+            live=self.env.verbose and sys.stderr.isatty(),
+        )
+        status.start()
+        try:
+            for row_result in executor.map(rows):
+                status.record(row_result[6], failed=not 0 < row_result[4] < 400)
+                yield row_result
+        finally:
+            status.close()
+
+    @staticmethod
+    def output_batch(env, endpoint, params_str, row_results, num_shared=0):
+        """ Collect the outcome of all calls of a batch, in the job database if
+            there is one, and output the results.
+        """
+        store, results, table = None, {}, None
+        if env.options.job_db:
+            store = JobStore(env.options.job_db, endpoint=endpoint, params=params_str)
+        if env.output in TABLE_OUTPUTS:
+            table = env.table(prefix=['row_key'])
+        try:
+            for key, values, call_endpoint, call_params, status, result, latency in row_results:
+                # With a job database or table output the results are not kept in memory.
+                if store is not None:
+                    store.add(key, values, call_endpoint, call_params, max(status, 0), latency, result)
+                if table is not None:
+                    if isinstance(result, str) and result.startswith('Error'):
+                        env.echo("Row {!s} failed: {!s}".format(key, result), force=True, err=True)
+                    else:
+                        table.writerows(result, prefix=[key])
+                elif store is None:
+                    results[key] = result
+        except KeyboardInterrupt:
+            # Keep the results of the calls that were made.
+            if store is not None:
+                store.close()
+            if table is not None:
+                table.flush()
+            raise
+        if callable(num_shared):
+            num_shared = num_shared()
+        if num_shared:
+            env.echo("{!s} duplicate calls were not made, their responses were shared.".format(num_shared),
+                     err=table is not None)
+        if table is not None:
+            table.flush()
+            env.echo("{!s} rows were written.".format(table.num_rows), err=True)
+            if store is not None:
+                env.echo("The results of job {!s} are in {!s}.".format(store.job_id, store.path), err=True)
+                store.close()
+            return
         # Output the results
+        if store is not None:
+            results = {'job': store.job_id, 'job db': store.path, 'calls per status': store.stats()}
+            store.close()
+        env.echo("Call output: ", style='heading')
+        env.output_response(results)
+
+    def _batch_call(self, call_method, endpoint, params_str, rows, num_rows=None, filter_path=None, method=None):
+        # Identical read only calls are made only once.
+        flights = SingleFlight() if self._is_read_only(endpoint, method) else None
+        CallCommands.output_batch(
+            self.env, endpoint, params_str,
+            self._batch_results(call_method, endpoint, params_str, rows, flights, num_rows, filter_path),
+            num_shared=lambda: flights.shared if flights is not None else 0,
+        )
+
+    def _run_shard(self, call_method, endpoint, params_str, byte_range, path, filter_path=None):
+        """ Make the calls for the rows in `byte_range` of the input file and
+            write their outcome to `path`, one json document per line. Runs in
+            a worker process of a sharded batch.
+        """
+        # Connections and the request log of the parent process are never shared with a worker.
+        self.ms1_api = None
+        self.ac2_api = None
+        if CallCommands.request_log is not None:
+            CallCommands.request_log = RequestLog(self.env.options.request_log)
+        if CallCommands.metrics is not None:
+            CallCommands.metrics = Metrics()
+        flights = SingleFlight() if self._is_read_only(endpoint) else None
+        # Every line is written as soon as it's complete, so the parent can follow the progress of the shard.
+        with open(path, 'w', buffering=1) as fp:
+            for row_result in self._batch_results(
+                call_method, endpoint, params_str, self._input_rows(byte_range), flights,
+                filter_path=filter_path, progress=False,
+            ):
+                fp.write(json.dumps(row_result, default=lambda o: "{!s}".format(o)) + '\n')
+            fp.write(json.dumps({
+                'shared': flights.shared if flights is not None else 0,
+                'metrics': self.metrics.dump() if self.metrics is not None else None,
+            }) + '\n')
+        # Worker processes exit without running the exit handlers.
+        if CallCommands.request_log is not None:
+            CallCommands.request_log.close()
+
+    @staticmethod
+    def _shard_results(paths, shared):
+        """ Yields the outcome of all calls of a sharded batch, shard by shard.
+        """
+        for path in paths:
+            with open(path, 'r') as fp:
+                for line in fp:
+                    row_result = json.loads(line)
+                    if isinstance(row_result, dict):
+                        shared.append(row_result['shared'])
+                        if CallCommands.metrics is not None and row_result['metrics'] is not None:
+                            CallCommands.metrics.merge(row_result['metrics'])
+                    else:
+                        yield tuple(row_result)
+
+    @staticmethod
+    def _follow_shard(path, offset, status):
+        """ Record the calls that a worker wrote to the shard at `path` after
+            `offset` in the batch `status`, and return the new offset.
+        """
+        if not os.path.exists(path):
+            return offset
+        with open(path, 'rb') as fp:
+            fp.seek(offset)
+            for line in fp:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                row_result = json.loads(line.decode('utf-8'))
+                if isinstance(row_result, list):
+                    status.record(row_result[6], failed=not 0 < row_result[4] < 400)
+        return offset
+
+    def _sharded_batch_call(self, call_method, endpoint, params_str, num_processes, num_rows=None,
+                            filter_path=None):
+        """ Split the input file in byte ranges and make the calls for every
+            range in its own worker process, so the work that is done for every
+            call is spread over multiple cpu cores.
+        """
+        ranges = shard_ranges(self.env.options.csv_file, num_processes, self.env.options.input_format)
+        shard_dir = tempfile.mkdtemp(prefix='clack-shards-')
+        paths = [os.path.join(shard_dir, 'shard-{:04d}.jsonl'.format(i)) for i in range(len(ranges))]
+        processes = []
+        # Workers are forked, so they start with the parsed options and settings of this process.
+        context = multiprocessing.get_context('fork')
+        try:
+            self.env.echo("Making the calls in {!s} processes.".format(len(ranges)))
+            for byte_range, path in zip(ranges, paths):
+                process = context.Process(
+                    target=self._run_shard, args=(call_method, endpoint, params_str, byte_range, path, filter_path),
+                )
+                process.start()
+                processes.append(process)
+            # The status line shows the calls of all workers, but not how many of them are in flight.
+            status = BatchStatus(total=num_rows, live=self.env.verbose and sys.stderr.isatty())
+            status.start()
+            offsets = [0] * len(paths)
+            try:
+                while True:
+                    # Follow the shards once more after the last worker is done, to get all of their calls.
+                    done = not [process for process in processes if process.is_alive()]
+                    offsets = [CallCommands._follow_shard(path, offset, status) for path, offset in zip(paths, offsets)]
+                    if done:
+                        break
+                    time.sleep(0.25)
+            finally:
+                status.close()
+            for process in processes:
+                process.join()
+            failed = [i for i, process in enumerate(processes) if process.exitcode != 0]
+            if failed:
+                return self.env.abort("The worker processes of shard(s) {!s} failed. Results are in {!s}.".format(
+                    ", ".join(["{!s}".format(i) for i in failed]), shard_dir,
+                ))
+            shared = []
+            CallCommands.output_batch(
+                self.env, endpoint, params_str, CallCommands._shard_results(paths, shared),
+                num_shared=lambda: sum(shared),
+            )
+            shutil.rmtree(shard_dir)
+        except (KeyboardInterrupt, SystemExit):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            raise
+
+    def _leased_batch_call(self, call_method, endpoint, params_str, filter_path=None):
+        """ Make the calls of a batch together with other clack instances, on
+            this or other hosts. The input file is split in chunks and every
+            instance makes the calls of the chunks it can claim in the lease
+            directory. The results are written to a file per instance and are
+            combined with "clack batch merge".
+        """
+        path = self.env.options.csv_file
+        size = os.path.getsize(path)
+        ranges = shard_ranges(path, max(1, -(-size // LEASE_CHUNK_SIZE)), self.env.options.input_format)
+        leases = LeaseDir(self.env.options.lease_dir, ttl=self.env.options.lease_ttl)
+        try:
+            leases.join({
+                'input': os.path.basename(path),
+                'input size': size,
+                'endpoint': endpoint,
+                'params': params_str,
+                'chunks': len(ranges),
+            })
+        except LeaseError as e:
+            return self.env.abort(e.message)
+        flights = SingleFlight() if self._is_read_only(endpoint) else None
+        num_chunks, num_calls = 0, 0
+        with open(leases.results_path(), 'a') as fp:
+            claimed = True
+            # Keep going while there is work, chunks of stopped instances included.
+            while claimed:
+                claimed = False
+                for chunk, byte_range in enumerate(ranges):
+                    if not leases.claim(chunk):
+                        continue
+                    claimed = True
+                    with leases.keep(chunk):
+                        for row_result in self._batch_results(
+                            call_method, endpoint, params_str, self._input_rows(byte_range), flights,
+                            filter_path=filter_path, progress=False,
+                        ):
+                            fp.write(json.dumps([chunk] + list(row_result), default=lambda o: "{!s}".format(o)))
+                            fp.write('\n')
+                            num_calls += 1
+                        fp.flush()
+                        os.fsync(fp.fileno())
+                    if leases.complete(chunk):
+                        num_chunks += 1
+                    self.env.echo("Chunk {!s} of {!s} is done.".format(chunk + 1, len(ranges)))
         self.env.echo("Call output: ", style='heading')
-        self.env.output_response(results)
+        self.env.output_response({
+            'instance': leases.instance,
+            'calls': num_calls,
+            'chunks done by this instance': num_chunks,
+            'chunks': leases.status(len(ranges)),
+        })
+        self.env.echo('Run "clack batch merge {!s}" to combine the results once all chunks are done.'.format(
+            leases.path,
+        ))
 
-    def call(self, endpoint, params_str):
-        """ The call command.
-            Invoked by: clack call
+    def _watch_call(self, call_method, endpoint, params_str):
+        """ Make the same call every --watch seconds and output only what
+            changed in the (filtered) response, until the --until condition is
+            met. Read only calls are made with conditional requests, so an
+            unchanged response is not sent again.
         """
-        # The call is made on behalf of another user, that we need to
-        # get to know first.
-        if self.env.options.as_user:
-            return self._setup_call_as_user(endpoint, params_str)
+        params = self._parse_params(params_str)
+        until = None
+        if self.env.options.until:
+            try:
+                until = Condition(self.env.options.until)
+            except ConditionError as e:
+                return self.env.abort(e.message)
+        if self._is_read_only(endpoint):
+            # The last response is kept for the conditional requests, on disk only if --cache is given.
+            if self.env.options.cache:
+                self.cache = ResponseCache(self.env.cache_path(), namespace="{!s}".format(self.name), ttl=0,
+                                           max_size=CACHE_MAX_SIZE)
+            else:
+                self.cache = MemoryCache(namespace="{!s}".format(self.name))
+        previous = None
+        try:
+            while True:
+                started = time.time()
+                success, status, resp = self._execute(call_method, endpoint, params)
+                timestamp = time.strftime('%H:%M:%S')
+                if not success:
+                    # Keep watching, the next call might go well again.
+                    self.env.echo("[{!s}] Error ({!s}): {!s}".format(
+                        timestamp, status, CallCommands._error_message(resp),
+                    ), force=True, err=True)
+                else:
+                    if self.env.options.filter_response:
+                        resp = self._filter_response(resp)
+                    if previous is None:
+                        self.env.echo("Response: ", style='heading')
+                        self.env.output_response(resp)
+                    else:
+                        for change in diff(previous, resp):
+                            self.env.echo("[{!s}] {!s}".format(timestamp, format_change(change)), force=True)
+                    previous = resp
+                    if until is not None and until.matches(resp, self._filter_response):
+                        self.env.echo("Condition met: {!s}".format(until.source))
+                        return
+                time.sleep(max(0, self.env.options.watch - (time.time() - started)))
+        except KeyboardInterrupt:
+            return
 
-        # Format the endpoint nicely
+    def _prepare_endpoint(self, endpoint):
+        """ Format the endpoint nicely
+        """
         endpoint = endpoint.strip('/ ')
         if not endpoint.startswith('v2/'):
             endpoint = 'v2/' + endpoint
@@ -339,14 +1159,82 @@ class CallCommands(object):
             endpoint = 'v2/admin/' + endpoint[3:]
         if self.api == 'ac2' and self.botr and not endpoint.startswith('v2/proxy/botr/'):
             endpoint = 'v2/proxy/botr/' + endpoint[3:]
+        return endpoint
+
+    def call(self, endpoint, params_str):
+        """ The call command.
+            Invoked by: clack call
+        """
+        # The call is made on behalf of another user, that we need to
+        # get to know first.
+        if self.env.options.as_user:
+            return self._setup_call_as_user(endpoint, params_str)
+
+        remember_endpoint(self.api, endpoint)
+        endpoint = self._prepare_endpoint(endpoint)
 
         # Let's show what settings we will be using for the call
         self.env.echo("Call settings:", style='heading')
         self.env.echo(self.env.colorize(self.env.create_table(self._pretty_config_map(endpoint, params_str))))
         call_method = getattr(self, '_call_{!s}'.format(self.api))
+        if self.env.options.upload_file and (self.api != 'ms1' or not endpoint.endswith('/create')):
+            return self.env.abort('--upload-file can only be used with */create calls of the ms1 api.')
 
-        # SINGLE CALL
-        if self.env.options.csv_file:
-            return self._batch_call(call_method, endpoint, params_str)
+        if self.env.options.pipe_to:
+            if self.env.options.dry_run:
+                return self.env.abort('A pipeline cannot be a dry run, because it needs the response of the first call.')
+            return self._pipe_call(call_method, endpoint, params_str)
+        elif self.env.options.retry_failed or self.env.options.csv_file:
+            if self.env.options.retry_failed:
+                job_id = JobStore.last_job_id(self.env.options.job_db) if self.env.options.job_db else None
+                if job_id is None:
+                    return self.env.abort('--retry-failed needs a --job-db with a previous job.')
+                rows = lambda: JobStore.failed_rows(self.env.options.job_db, job_id)
+            else:
+                rows = self._input_rows
+            # Check all rows first. This also gives us the number of rows for the ETA.
+            # Input from stdin can be read only once, so its rows are checked as they are called.
+            num_rows = None
+            if self.env.options.retry_failed or is_rereadable(self.env.options.csv_file):
+                num_rows = self._preflight(endpoint, params_str, rows())
+            if self.env.options.dry_run:
+                return self._dry_run(endpoint, params_str, rows())
+            if self.env.options.lease_dir:
+                if self.env.options.retry_failed or not is_shardable(self.env.options.csv_file):
+                    return self.env.abort('--lease-dir needs an uncompressed input file (not stdin).')
+                if self.env.options.processes > 1 or self.env.options.job_db:
+                    return self.env.abort('--lease-dir cannot be combined with --processes or --job-db. '
+                                          'Use --job-db with "clack batch merge" instead.')
+                return self._leased_batch_call(
+                    call_method, endpoint, params_str, filter_path=self.env.options.filter_response,
+                )
+            if self.env.options.processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+                self.env.echo("Worker processes cannot be forked on this platform, all calls are made by this "
+                              "process.", err=True)
+            elif self.env.options.processes > 1:
+                if self.env.options.retry_failed or not is_shardable(self.env.options.csv_file):
+                    return self.env.abort('--processes needs an uncompressed input file (not stdin).')
+                if self.cassette is not None:
+                    return self.env.abort('--processes cannot be combined with --record or --replay.')
+                return self._sharded_batch_call(
+                    call_method, endpoint, params_str, self.env.options.processes,
+                    num_rows=num_rows, filter_path=self.env.options.filter_response,
+                )
+            return self._batch_call(
+                call_method, endpoint, params_str, rows(),
+                num_rows=num_rows, filter_path=self.env.options.filter_response,
+            )
+        elif self.env.options.dry_run:
+            return self._dry_run(endpoint, params_str, [(None, {})])
+        elif self.env.options.watch:
+            return self._watch_call(call_method, endpoint, params_str)
+        elif self.env.options.upload_file:
+            if not os.path.isfile(self.env.options.upload_file):
+                return self.env.abort('The upload file {!s} does not exist.'.format(self.env.options.upload_file))
+            return self._single_call(
+                self._uploader(call_method, self.env.options.upload_file, progress=True), endpoint, params_str,
+            )
+        elif self.env.output in TABLE_OUTPUTS and '*' in (self.env.options.filter_response or '').split('.'):
+            return self._table_call(call_method, endpoint, params_str)
         else:
             return self._single_call(call_method, endpoint, params_str)
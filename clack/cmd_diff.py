@@ -0,0 +1,106 @@
+import requests
+import threading
+
+from .cmd_call import CallCommands
+from .lib_diff import align
+from .lib_diff import diff
+from .lib_diff import format_change
+from .lib_input import InputError
+from .lib_input import read_documents
+from .lib_stream import prefetch
+
+CHANGE_COLORS = {
+    'added': 'green',
+    'removed': 'red',
+    'changed': 'yellow',
+}
+
+
+class DiffCommands(object):
+
+    @staticmethod
+    def _output(env, old, new, show_key=True):
+        """ Align the records of `old` and `new` and output every added, removed
+            and changed field, followed by a summary. The key (or position) of
+            a record is the first part of the path of its changes.
+        """
+        counts = {'same': 0, 'changed': 0, 'added': 0, 'removed': 0}
+        for key, old_record, new_record in align(old, new, env.options.key_path, env.options.window):
+            if new_record is None:
+                changes = [('removed', (key,), old_record, None)]
+            elif old_record is None:
+                changes = [('added', (key,), None, new_record)]
+            else:
+                changes = list(diff(old_record, new_record, (key,) if show_key else ()))
+            if not changes:
+                counts['same'] += 1
+                continue
+            counts[changes[0][0] if new_record is None or old_record is None else 'changed'] += 1
+            for change in changes:
+                env.echo(env.style(format_change(change), fg=CHANGE_COLORS[change[0]]), force=True)
+        env.echo("{same!s} records are the same, {changed!s} changed, {added!s} added and {removed!s} removed.".format(
+            **counts
+        ), err=True)
+
+    @staticmethod
+    def _response(name, call_method, endpoint, params, results):
+        """ Make a call and store whether it succeeded and the response in
+            `results` under the name of the env.
+        """
+        try:
+            results[name] = call_method(endpoint, params)
+        except requests.RequestException as e:
+            results[name] = (False, e)
+
+    @staticmethod
+    def calls(env, names, apicall, params_str):
+        """ The diff calls command.
+            Invoked by: clack diff calls --env NAME --env NAME
+        """
+        if len(names) != 2:
+            return env.abort('Use --env twice, to compare the responses of two envs.')
+        commands = CallCommands.env_commands(env, names)
+        if env.options.filter_response:
+            # Both envs are called at the same time, page by page.
+            streams = [enumerate(prefetch(command._paged_items(
+                getattr(command, '_call_{!s}'.format(command.api)),
+                command._prepare_endpoint(apicall),
+                command._parse_params(params_str),
+            ))) for command in commands]
+        else:
+            results = {}
+            # Both envs are called at the same time.
+            threads = [threading.Thread(target=DiffCommands._response, args=(
+                command.name,
+                getattr(command, '_call_{!s}'.format(command.api)),
+                command._prepare_endpoint(apicall),
+                command._parse_params(params_str),
+                results,
+            )) for command in commands]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+            streams = []
+            for command in commands:
+                success, resp = results[command.name]
+                if not success:
+                    return env.abort('The call of {!s} for {!s} failed: {!s}'.format(
+                        apicall, command.name, CallCommands._error_message(resp),
+                    ))
+                streams.append([(0, resp.json() if hasattr(resp, 'json') else resp)])
+        # Without a filter there is a single record per env.
+        DiffCommands._output(env, *streams, show_key=bool(env.options.filter_response))
+
+    @staticmethod
+    def files(env, old_path, new_path):
+        """ The diff files command.
+            Invoked by: clack diff files
+        """
+        if old_path == '-' and new_path == '-':
+            return env.abort('Only one of the files can be read from stdin.')
+        try:
+            DiffCommands._output(env, prefetch(read_documents(old_path)), prefetch(read_documents(new_path)))
+        except (InputError, IOError) as e:
+            return env.abort("Could not read the input file: {!s}".format(e))
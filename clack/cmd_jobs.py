@@ -0,0 +1,165 @@
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+
+from .lib_jobs import Job
+from .lib_jobs import JobError
+from .lib_jobs import is_alive
+from .lib_jobstore import JobStore
+
+# Seconds a cancelled job gets to store its results, before it's killed.
+CANCEL_TIMEOUT = 10
+
+
+def _time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) if timestamp else '-'
+
+
+class JobsCommands(object):
+
+    @staticmethod
+    def _find(env, job_id):
+        try:
+            return Job.find(env.jobs_path(), job_id)
+        except JobError as e:
+            return env.abort(e.message)
+
+    @staticmethod
+    def _command(job):
+        return 'clack call ' + ' '.join([shlex.quote(arg) for arg in job.data.get('args', [])])
+
+    @staticmethod
+    def submit(env, args):
+        """ The jobs submit command.
+            Invoked by: clack jobs submit
+        """
+        if not args:
+            return env.abort('Give the options and arguments of the call, like you would for "clack call".')
+        if [arg for arg in args if arg == '--job-db' or arg.startswith('--job-db=')]:
+            return env.abort('A job stores its results in its own job database, --job-db cannot be used.')
+        job = Job.create(env.jobs_path(), args, os.getcwd())
+        # The job runs in its own session, so it keeps running when the terminal is closed.
+        with open(job.log_path, 'ab') as log:
+            subprocess.Popen(
+                [sys.executable, '-m', 'clack', 'jobs', 'run', job.id],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                cwd=job.data['cwd'],
+                close_fds=True,
+                start_new_session=True,
+            )
+        env.echo("Submitted job {!s}.".format(job.id), force=True)
+        env.echo('Use "clack jobs status {0!s}" or "clack jobs attach {0!s}" to follow it.'.format(job.id))
+
+    @staticmethod
+    def run(env, job_id):
+        """ The jobs run command, that runs a submitted job.
+            Invoked by: clack jobs submit
+        """
+        job = JobsCommands._find(env, job_id)
+        if job.data.get('cancelled'):
+            return job.save(state='cancelled', finished_at=time.time())
+        job.load().save(state='running', pid=os.getpid(), started_at=time.time())
+        with open(job.log_path, 'ab') as log:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'clack', 'call', '--job-db', job.db_path] + job.data['args'],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                cwd=job.data['cwd'],
+            )
+            job.load().save(child_pid=process.pid)
+            exit_code = process.wait()
+        job.load()
+        state = 'cancelled' if job.data.get('cancelled') else ('done' if exit_code == 0 else 'failed')
+        job.save(state=state, exit_code=exit_code, finished_at=time.time())
+
+    @staticmethod
+    def status(env, job_id=None):
+        """ The jobs status command.
+            Invoked by: clack jobs status
+        """
+        if job_id is None:
+            jobs = Job.all(env.jobs_path())
+            if not jobs:
+                return env.echo("There are no jobs.", force=True)
+            env.echo(env.colorize(env.create_table(
+                [(job.id, "{!s}, {!s}: {!s}".format(
+                    job.state, _time(job.data.get('submitted_at')), JobsCommands._command(job),
+                )) for job in jobs],
+                headers=('job', 'state, submitted: command'),
+            )), force=True)
+            return
+        job = JobsCommands._find(env, job_id)
+        table = [
+            ('job', job.id),
+            ('state', job.state),
+            ('command', JobsCommands._command(job)),
+            ('directory', job.data.get('cwd')),
+            ('submitted', _time(job.data.get('submitted_at'))),
+            ('started', _time(job.data.get('started_at'))),
+            ('finished', _time(job.data.get('finished_at'))),
+        ]
+        if job.data.get('exit_code') is not None:
+            table.append(('exit code', job.data['exit_code']))
+        for status, stats in sorted(JobStore.read_stats(job.db_path).items()):
+            table.append(('calls with status {!s}'.format(status), '{!s}, avg latency {!s}s, max latency {!s}s'.format(
+                stats['calls'], stats['avg latency'], stats['max latency'],
+            )))
+        if job.is_active:
+            table.append(('progress', job.last_line() or '-'))
+        table.append(('output', job.log_path))
+        table.append(('results', job.db_path))
+        env.echo(env.colorize(env.create_table(table)), force=True)
+
+    @staticmethod
+    def attach(env, job_id):
+        """ The jobs attach command.
+            Invoked by: clack jobs attach
+        """
+        job = JobsCommands._find(env, job_id)
+        try:
+            with open(job.log_path, 'r', encoding='utf-8', errors='replace') as fp:
+                while True:
+                    # Read once more after the job finished, to get the last of its output.
+                    active = job.load().is_active
+                    output = fp.read()
+                    if output:
+                        env.echo(output, force=True, nl=False)
+                    if not active:
+                        break
+                    elif not output:
+                        time.sleep(0.5)
+        except KeyboardInterrupt:
+            env.echo("\nDetached from job {!s}, it keeps running.".format(job.id), force=True, err=True)
+            return
+        env.echo("Job {!s} is {!s}.".format(job.id, job.state), force=True, err=True)
+
+    @staticmethod
+    def cancel(env, job_id):
+        """ The jobs cancel command.
+            Invoked by: clack jobs cancel
+        """
+        job = JobsCommands._find(env, job_id)
+        if not job.is_active:
+            return env.abort('Job {!s} is not running, it is {!s}.'.format(job.id, job.state))
+        job.load().save(cancelled=True)
+        # The call is interrupted like with Ctrl+C, so it stores the results it has so far.
+        child_pid = job.data.get('child_pid')
+        if is_alive(child_pid):
+            os.kill(child_pid, signal.SIGINT)
+        deadline = time.time() + CANCEL_TIMEOUT
+        while job.load().is_active and time.time() < deadline:
+            time.sleep(0.2)
+        if job.is_active:
+            if job.data.get('pid'):
+                try:
+                    os.killpg(job.data['pid'], signal.SIGKILL)
+                except OSError:
+                    pass
+            job.save(state='cancelled', finished_at=time.time())
+        env.echo("Job {!s} is cancelled.".format(job.id), force=True)
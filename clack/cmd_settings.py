@@ -2,7 +2,7 @@ import click
 import os
 import shutil
 
-from environment import COMMON_SETTINGS
+from .environment import COMMON_SETTINGS
 
 
 class SettingsCommands(object):
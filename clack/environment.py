@@ -1,14 +1,15 @@
+import atexit
 import click
-import ConfigParser
+import configparser
 import keyring
 import json
 import os
 import pprint
 import re
+import shutil
 import subprocess
 import sys
 
-from distutils.version import StrictVersion
 from pygments import highlight
 from pygments import lexer
 from pygments import token
@@ -18,7 +19,9 @@ from pygments.formatters import Terminal256Formatter
 from pygments.formatters import TerminalFormatter
 from pygments.styles import STYLE_MAP
 
-from version import VERSION
+from .lib_complete import APP_NAME
+from .lib_table import TableWriter
+from .version import VERSION
 
 try:
     import curses
@@ -26,19 +29,20 @@ except ImportError:
     curses = None  # Compiled w/o curses
 
 
-APP_NAME = 'Clack'
+CACHE_MAX_SIZE = 100 * 1024 * 1024
 DEFAULT_INDENT = 4
 KEYRING_ID = 'com.github.rmnl.clack.'
+LEASE_CHUNK_SIZE = 4 * 1024 * 1024
 TAB_SIZE = 4
 
 COMMON_SETTINGS = {
     'color_scheme': {
         'default': 'monokai',
-        'options': ['no-colors', ] + STYLE_MAP.keys(),
+        'options': ['no-colors', ] + sorted(STYLE_MAP),
     },
     'output': {
         'default': 'json',
-        'options': ['json', 'py'],
+        'options': ['json', 'py', 'csv', 'tsv'],
     },
     'verbosity': {
         'default': 'auto',
@@ -46,7 +50,10 @@ COMMON_SETTINGS = {
     },
 }
 
-OUTPUT_OPTIONS = ['json', 'py']
+OUTPUT_OPTIONS = ['json', 'py', 'csv', 'tsv']
+
+# Output formats that are written row by row.
+TABLE_OUTPUTS = ['csv', 'tsv']
 
 FIND_USERS_BY = {
     'email': {
@@ -112,11 +119,11 @@ class Environment(object):
     is_windows = 'win32' in str(sys.platform).lower()
     stdout_isatty = sys.stdout.isatty()
     term_colors = 256
-    term_width, term_height = click.get_terminal_size()
+    term_width, term_height = shutil.get_terminal_size()
 
     def __init__(self):
         # Initialize the config
-        self.config = ConfigParser.RawConfigParser(allow_no_value=True)
+        self.config = configparser.RawConfigParser(allow_no_value=True)
         self.config.read([Environment.config_path()])
 
     # We have second init method, because we want to be able to use this class
@@ -167,7 +174,7 @@ class Environment(object):
         version = self.get('etc', 'version', '0.0.1')
         upgrades = []
 
-        if StrictVersion(version) < StrictVersion('0.4.0'):
+        if version_info(version) < version_info('0.4.0'):
             upgrades.append('Moving secrets/passwords from config file to keyring for:')
             for section in self.sections:
                 key = self.get(section, 'key')
@@ -177,7 +184,7 @@ class Environment(object):
                     self.set(section, 'secret', None)
                     upgrades.append('- {!s}'.format(section))
 
-        if StrictVersion(version) < StrictVersion('0.5.0'):
+        if version_info(version) < version_info('0.5.0'):
             upgrades.append('Removing ac1 configurations because that API no longer exists')
             for section in self.sections:
                 api = self.get(section, 'api')
@@ -191,7 +198,7 @@ class Environment(object):
             if not self.get('etc', 'default') in self.sections:
                 self.set('etc', 'default', self.sections[0] if self.sections else None)
 
-        if StrictVersion(version) < StrictVersion('2.0.0b3'):
+        if version_info(version) < version_info('2.0.0b3'):
             upgrades.append('Renaming default to env.')
             default = self.get('etc', 'default')
             if default is not None:
@@ -218,6 +225,30 @@ class Environment(object):
             click.get_app_dir(APP_NAME, force_posix=True), 'config.ini'
         )
 
+    @staticmethod
+    def cache_path():
+        """ Returns the path of the directory with cached responses.
+        """
+        return os.path.join(
+            click.get_app_dir(APP_NAME, force_posix=True), 'cache'
+        )
+
+    @staticmethod
+    def upload_state_path():
+        """ Returns the path of the directory with the state of unfinished uploads.
+        """
+        return os.path.join(
+            click.get_app_dir(APP_NAME, force_posix=True), 'uploads'
+        )
+
+    @staticmethod
+    def jobs_path():
+        """ Returns the path of the directory with the jobs that run detached.
+        """
+        return os.path.join(
+            click.get_app_dir(APP_NAME, force_posix=True), 'jobs'
+        )
+
     def get(self, section, key, fallback=None):
         """ Get a value in the config file for `key` in `section` with
             `fallback` value if the `key` cannot be found.
@@ -238,7 +269,7 @@ class Environment(object):
     def save(self):
         """ Save the config file
         """
-        with open(Environment.config_path(), 'wb') as cfp:
+        with open(Environment.config_path(), 'w') as cfp:
             self.config.write(cfp)
 
     def check(self):
@@ -318,7 +349,7 @@ class Environment(object):
                 msg = ("{:<" + str(self.term_width) + "}").format(msg)
                 msg = self.style(msg, fg=STYLES[style]['fg'], bg=STYLES[style]['bg'],
                                  reverse=STYLES[style]['reverse'])
-            if not isinstance(msg, basestring):
+            if not isinstance(msg, str):
                 msg = "{!s}".format(msg)
             click.echo(msg, *args, **kwargs)
 
@@ -351,13 +382,27 @@ class Environment(object):
         lines.append("")
         return lines
 
+    def table(self, prefix=()):
+        """ Returns a writer for csv or tsv output to the --output-file, or to
+            stdout if there is none.
+        """
+        fp = sys.stdout
+        if self.options.output_file:
+            fp = open(self.options.output_file, 'w', encoding='utf-8', newline='')
+            atexit.register(fp.close)
+        return TableWriter(fp, output=self.output, prefix=prefix, warn=lambda msg: self.echo(msg, force=True, err=True))
+
     def output_response(self, resp):
+        if self.output in TABLE_OUTPUTS:
+            table = self.table()
+            table.writerows(resp)
+            return table.flush()
         if self.options.no_formatting:
-            output = resp if isinstance(resp, basestring) else "{!s}".format(resp)
+            output = resp if isinstance(resp, str) else "{!s}".format(resp)
             return self.echo(output, force=True)
         resp_dict = resp if isinstance(resp, (dict, list)) else json.loads(resp)
         if self.output == 'py':
-            output = pprint.pformat(resp_dict, indent=DEFAULT_INDENT, width=10, depth=None)
+            output = pprint.pformat(resp_dict, indent=DEFAULT_INDENT, width=self.term_width, depth=None)
         else:
             output = json.dumps(
                 obj=resp_dict,
@@ -381,7 +426,7 @@ class Environment(object):
         if isinstance(data, list):
             return [highlight(line, TableLexer(), formatter).strip() for line in data]
         else:
-            return highlight(data, OUTPUT_LEXERS[self.output](), formatter).strip()
+            return highlight(data, OUTPUT_LEXERS.get(self.output, JsonLexer)(), formatter).strip()
         return data
 
     # User input
@@ -389,7 +434,7 @@ class Environment(object):
     def input(self, question, *args, **kwargs):
         """ Ask for user input
         """
-        question = question if isinstance(question, basestring) else "{!s}".format(question)
+        question = question if isinstance(question, str) else "{!s}".format(question)
         return click.prompt(question, *args, **kwargs)
 
     def validated_input(self, question, regex=None, options=None, error_msg=None, *args, **kwargs):
@@ -566,7 +611,7 @@ class Options(object):
     """
 
     def __init__(self, initial={}, **kwargs):
-        self.options = dict(initial.items() + kwargs.items())
+        self.options = dict(initial, **kwargs)
 
     def __getattr__(self, name):
         return self.get(name)
@@ -581,10 +626,17 @@ class Options(object):
         return self.options.get(name, default)
 
 
-class ProgressList(list):
-    """ Additional class that expands the built in list with
-        an update method similar to the progressbar class
+class ProgressList(object):
+    """ Additional class that wraps the iterable with an update method
+        similar to the progressbar class. Items are not read in advance,
+        so results are handled while the iterable is still going.
     """
+    def __init__(self, iterable):
+        self.iterable = iterable
+
+    def __iter__(self):
+        return iter(self.iterable)
+
     def update(self, *args, **kwargs):
         pass
 
@@ -612,6 +664,17 @@ class TableLexer(lexer.RegexLexer):
     }
 
 
+def version_info(version):
+    """ Returns a version like 2.0.0b3 as a tuple that can be compared to the
+        tuples of other versions. Pre-releases come before the release itself.
+    """
+    match = re.match(r'^(\d+)\.(\d+)(?:\.(\d+))?(?:([ab])(\d+))?$', version)
+    if match is None:
+        raise ValueError('Not a valid version: {!s}'.format(version))
+    major, minor, patch, pre, pre_num = match.groups()
+    return int(major), int(minor), int(patch or 0), pre or 'final', int(pre_num or 0)
+
+
 def execute(command_list):
     """ Executes commands on the command line.
         Returns tuple with the result True|False and
@@ -619,19 +682,20 @@ def execute(command_list):
     """
     try:
         command = [
-            c if isinstance(c, basestring) else str(c) for c in command_list
+            c if isinstance(c, str) else str(c) for c in command_list
         ]
         proc = subprocess.Popen(
             command,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
+            universal_newlines=True,
         )
         out, err = proc.communicate()
         if proc.returncode:
             return False, err
         return True, out
-    except OSError, e:
-        if e[0] == 2:  # No such file or directory
+    except OSError as e:
+        if e.errno == 2:  # No such file or directory
             return False, '"%s" is not available on your system.' % command[0]
         else:
             raise e
@@ -0,0 +1,248 @@
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from queue import Queue
+
+_STOP = object()
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight(object):
+    """ Makes sure that identical calls are made only once. Callers that ask
+        for a call that is in flight wait for it and share its result. Results
+        that should be kept are remembered for later callers, up to `max_size`
+        results.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.flights = OrderedDict()
+        self.lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn, keep=None):
+        """ Returns the result of `fn` for `key`, calling it only if there is no
+            result (or call in flight) for `key` yet.
+        """
+        with self.lock:
+            flight = self.flights.pop(key, None)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+            else:
+                self.shared += 1
+            self.flights[key] = flight
+            while len(self.flights) > self.max_size:
+                self.flights.popitem(last=False)
+        if not leader:
+            flight.done.wait()
+            # The call failed with an exception, so there's nothing to share.
+            return fn() if flight.result is None else flight.result
+        try:
+            flight.result = fn()
+        finally:
+            if flight.result is None or (keep is not None and not keep(flight.result)):
+                with self.lock:
+                    if self.flights.get(key) is flight:
+                        del self.flights[key]
+            flight.done.set()
+        return flight.result
+
+
+class AIMDController(object):
+    """ Limits the number of calls in flight. The limit is increased by one
+        after every window of calls that went well and halved after a window
+        with throttled calls (429, 5xx or connection errors) or a latency that
+        is much higher than the usual latency.
+    """
+
+    def __init__(self, min_limit=1, max_limit=1, log=None, decrease=0.5, latency_factor=2.0):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = min_limit
+        self.log = log
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.window = []
+        self.base_latency = None
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """ Wait until another call may be made.
+        """
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, throttled=False):
+        """ Register a finished call and adjust the limit once a full window of
+            calls has finished.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if latency is not None:
+                self.window.append((latency, throttled))
+            if self.window and len(self.window) >= self.limit:
+                self._adjust()
+            self.condition.notify_all()
+
+    def _adjust(self):
+        num_throttled = sum(1 for latency, throttled in self.window if throttled)
+        avg_latency = sum(latency for latency, throttled in self.window) / len(self.window)
+        # The base latency slowly drifts up, so a permanent change in latency
+        # becomes the new normal.
+        if self.base_latency is None:
+            self.base_latency = avg_latency
+        else:
+            self.base_latency = min(avg_latency, self.base_latency * 1.05)
+        old_limit = self.limit
+        if num_throttled:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+            reason = '{!s} of {!s} calls throttled or failed'.format(num_throttled, len(self.window))
+        elif avg_latency > self.base_latency * self.latency_factor:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+            reason = 'latency went up to {:.3f}s'.format(avg_latency)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+            reason = 'latency is {:.3f}s'.format(avg_latency)
+        self.window = []
+        if self.limit != old_limit and self.log is not None:
+            self.log('Concurrency {!s} -> {!s}: {!s}'.format(old_limit, self.limit, reason))
+
+
+class BatchExecutor(object):
+    """ Runs `work` for all tasks in a pool of worker threads. The number of
+        tasks in flight is limited by the `controller`. Results are yielded
+        in the order in which they finish.
+    """
+
+    def __init__(self, work, controller, is_throttled=None):
+        self.work = work
+        self.controller = controller
+        self.is_throttled = is_throttled or (lambda result: False)
+
+    def map(self, tasks):
+        num_workers = self.controller.max_limit
+        task_queue = Queue(maxsize=num_workers * 2)
+        result_queue = Queue()
+        failures = []
+
+        def feed():
+            try:
+                for task in tasks:
+                    task_queue.put(task)
+            except BaseException:
+                failures.append(sys.exc_info())
+            for i in range(num_workers):
+                task_queue.put(_STOP)
+
+        def run():
+            while True:
+                # Take a task only when it may be started, so tasks start in order.
+                self.controller.acquire()
+                task = task_queue.get()
+                if task is _STOP:
+                    self.controller.release()
+                    break
+                started, throttled = time.time(), True
+                try:
+                    result = self.work(task)
+                    throttled = self.is_throttled(result)
+                    result_queue.put((result, None))
+                except BaseException:
+                    result_queue.put((_STOP, sys.exc_info()))
+                finally:
+                    self.controller.release(time.time() - started, throttled)
+            result_queue.put((_STOP, None))
+
+        threads = [threading.Thread(target=feed)] + [threading.Thread(target=run) for i in range(num_workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = num_workers
+        while running:
+            result, exc_info = result_queue.get()
+            if exc_info is not None:
+                raise exc_info[1].with_traceback(exc_info[2])
+            elif result is _STOP:
+                running -= 1
+            else:
+                yield result
+        if failures:
+            raise failures[0][1].with_traceback(failures[0][2])
+
+
+class CircuitBreaker(object):
+    """ Stops calls to a host that keeps failing. After `threshold` failed
+        calls in a row the circuit opens and all calls wait. Once `cooldown`
+        seconds have passed, a single call is let through to probe the host.
+        If it succeeds the circuit closes again, otherwise it stays open for
+        twice as long (up to `max_cooldown` seconds).
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, host, threshold=10, cooldown=30, max_cooldown=600, log=None):
+        self.host = host
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.log = log
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.condition = threading.Condition()
+
+    def _log(self, msg):
+        if self.log is not None:
+            self.log('Circuit for {!s} {!s}'.format(self.host, msg))
+
+    def before(self):
+        """ Wait until a call to the host may be made.
+        """
+        with self.condition:
+            while self.state != CircuitBreaker.CLOSED:
+                remaining = self.opened_at + self.cooldown - time.time()
+                if self.state == CircuitBreaker.OPEN and remaining <= 0:
+                    self.state = CircuitBreaker.HALF_OPEN
+                    self._log('is half-open, probing with a single call.')
+                    return
+                # Other calls wait for the probe or the end of the cooldown.
+                self.condition.wait(max(remaining, 1) if self.state == CircuitBreaker.OPEN else 1)
+
+    def after(self, failed):
+        """ Register the outcome of a call to the host.
+        """
+        with self.condition:
+            if not failed:
+                self.failures = 0
+                if self.state != CircuitBreaker.CLOSED:
+                    self.state = CircuitBreaker.CLOSED
+                    self.cooldown = self.base_cooldown
+                    self._log('is closed again, resuming calls.')
+            else:
+                self.failures += 1
+                if self.state == CircuitBreaker.HALF_OPEN:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                    self._open('the probe failed')
+                elif self.state == CircuitBreaker.CLOSED and self.failures >= self.threshold:
+                    self._open('{!s} calls in a row failed'.format(self.failures))
+            self.condition.notify_all()
+
+    def _open(self, reason):
+        self.state = CircuitBreaker.OPEN
+        self.opened_at = time.time()
+        self._log('is open, because {!s}. Pausing calls for {!s} seconds.'.format(reason, self.cooldown))
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .lib_cassette import CassetteResponse
+
+
+class ResponseCache(object):
+    """ Disk backed cache for the responses of read only calls.
+
+        Every response is stored in its own file. The modification time of a
+        file is bumped whenever the response is used, which makes it easy to
+        evict the least recently used responses when the cache grows too big.
+    """
+
+    def __init__(self, directory, namespace='', ttl=300, max_size=100 * 1024 * 1024):
+        self.directory = directory
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_size = max_size
+        self.size = None
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, info, scope=None):
+        key = json.dumps([self.namespace, scope, info], sort_keys=True)
+        return os.path.join(self.directory, '{!s}.json'.format(hashlib.sha1(key.encode('utf-8')).hexdigest()))
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as fp:
+                entry = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+        os.utime(path, None)
+        return entry
+
+    def _write(self, path, entry):
+        tmp_path = '{!s}.{!s}.tmp'.format(path, threading.current_thread().ident)
+        with open(tmp_path, 'w') as fp:
+            json.dump(entry, fp)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.rename(tmp_path, path)
+        with self.lock:
+            if self.size is not None:
+                # A response that is stored again (e.g. after revalidation) replaces the old file.
+                self.size += os.path.getsize(path) - old_size
+        self._evict()
+
+    def _evict(self):
+        """ Remove the least recently used responses until the cache fits
+            within its maximum size again.
+        """
+        with self.lock:
+            if self.size is not None and self.size <= self.max_size:
+                return
+            files = []
+            for name in os.listdir(self.directory):
+                # Temporary files are about to be renamed by other threads.
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            self.size = sum(f[1] for f in files)
+            for mtime, size, path in sorted(files):
+                if self.size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.size -= size
+
+    @staticmethod
+    def _response(entry, url=None):
+        return CassetteResponse(
+            status_code=entry['status_code'],
+            headers=entry['headers'],
+            text=entry['text'],
+            url=url,
+        )
+
+    def _store(self, path, resp):
+        self._write(path, {
+            'stored_at': time.time(),
+            'status_code': resp.status_code,
+            'headers': dict(resp.headers),
+            'text': resp.text,
+        })
+
+    def lookup(self, info, scope=None):
+        """ Returns the cached response for the request described by `info` if
+            it is still fresh.
+        """
+        entry = self._read(self._path(info, scope))
+        if entry is not None and time.time() - entry['stored_at'] < self.ttl:
+            return ResponseCache._response(entry, url=info['url'])
+        return None
+
+    def request(self, send, info, scope=None):
+        """ Returns a fresh cached response or uses the `send` callable to get
+            the response. Stale responses are revalidated with a conditional
+            request if the server gave us an ETag or a Last-Modified date.
+        """
+        path = self._path(info, scope)
+        entry = self._read(path)
+        if entry is not None and time.time() - entry['stored_at'] < self.ttl:
+            return ResponseCache._response(entry, url=info['url'])
+        conditional = {}
+        if entry is not None:
+            headers = dict([(k.lower(), v) for k, v in entry['headers'].items()])
+            if headers.get('etag'):
+                conditional['If-None-Match'] = headers['etag']
+            if headers.get('last-modified'):
+                conditional['If-Modified-Since'] = headers['last-modified']
+        resp = send(conditional)
+        if resp.status_code == 304 and entry is not None:
+            entry['stored_at'] = time.time()
+            self._write(path, entry)
+            return ResponseCache._response(entry, url=info['url'])
+        if resp.status_code == 200:
+            self._store(path, resp)
+        return resp
+
+
+class MemoryCache(ResponseCache):
+    """ Keeps the responses in memory instead of on disk, e.g. for the
+        conditional requests of a call that is made over and over again.
+    """
+
+    def __init__(self, namespace='', ttl=0):
+        self.directory = ''
+        self.namespace = namespace
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def _read(self, path):
+        with self.lock:
+            entry = self.entries.get(path)
+        return None if entry is None else dict(entry)
+
+    def _write(self, path, entry):
+        with self.lock:
+            self.entries[path] = entry
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import threading
+
+from requests.structures import CaseInsensitiveDict
+
+
+# Request fields that are never written to (or used to look up) a cassette.
+REDACTED_FIELDS = ['login', 'password', 'userEmail', 'userPassword', 'api_key', 'api_secret']
+
+# Response fields that are never written to a cassette. Any response can hold
+# the signature of a session, e.g. the user session of --as-user. The id of a
+# response of the session endpoints is a session as well.
+REDACTED_RESPONSE_FIELDS = ['signature']
+SESSION_ENDPOINTS = ['account/sessions/start', 'admin/sessions']
+REDACTED_SESSION_FIELDS = ['signature', 'id']
+
+# Every line in a cassette starts with '{"key": "' followed by a 40 character
+# sha1 hex digest. This allows indexing a cassette without decoding the (possibly
+# huge) recorded responses.
+KEY_OFFSET = len('{"key": "')
+KEY_LENGTH = 40
+
+
+class CassetteError(Exception):
+
+    def __init__(self, message):
+        super(CassetteError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class CassetteResponse(object):
+    """ Minimal stand-in for a requests.Response that is served from a cassette.
+    """
+
+    def __init__(self, status_code=200, headers=None, text='', url=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.text = text
+        self.url = url
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+
+class Cassette(object):
+    """ Records requests and their responses to a jsonl file or replays them
+        from that file without touching the network.
+    """
+
+    def __init__(self, path, mode='record'):
+        if mode not in ('record', 'replay'):
+            raise ValueError('Unknown cassette mode: {!s}'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.index = {}
+        self.lock = threading.Lock()
+        if self.replaying:
+            self.fp = open(path, 'rb')
+            self._build_index()
+        else:
+            self.fp = open(path, 'ab')
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    @staticmethod
+    def _redact(data, fields=REDACTED_FIELDS):
+        if isinstance(data, dict):
+            return dict([(k, '********' if k in fields else v) for k, v in data.items()])
+        return data
+
+    @staticmethod
+    def _redact_response(url, text):
+        """ Returns the text of a response without the sessions in it.
+        """
+        fields = REDACTED_RESPONSE_FIELDS
+        if [endpoint for endpoint in SESSION_ENDPOINTS if url.rstrip('/').endswith('/' + endpoint)]:
+            fields = REDACTED_SESSION_FIELDS
+        if not [field for field in fields if '"{!s}"'.format(field) in text]:
+            return text
+        try:
+            resp = json.loads(text)
+        except ValueError:
+            return text
+        if not isinstance(resp, dict):
+            return text
+        resp = Cassette._redact(resp, fields)
+        if 'return_value' in resp:
+            resp['return_value'] = Cassette._redact(resp['return_value'], fields)
+        return json.dumps(resp)
+
+    @staticmethod
+    def request_info(api, method, url, params=None, data=None):
+        """ Returns the (redacted) description of a request that is used for
+            recording and looking up a response.
+        """
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                pass
+        return {
+            'api': api,
+            'method': method.upper(),
+            'url': url,
+            'params': Cassette._redact(params),
+            'data': Cassette._redact(data),
+        }
+
+    @staticmethod
+    def key(info):
+        return hashlib.sha1(json.dumps(info, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _build_index(self):
+        offset = 0
+        for line in self.fp:
+            if line.strip():
+                self.index.setdefault(line[KEY_OFFSET:KEY_OFFSET + KEY_LENGTH].decode('ascii'), []).append(offset)
+            offset += len(line)
+
+    def _read(self, key):
+        with self.lock:
+            offsets = self.index.get(key)
+            if not offsets:
+                return None
+            # Identical requests are served in the order they were recorded. The
+            # last recorded response is reused once a key runs out of responses.
+            offset = offsets.pop(0) if len(offsets) > 1 else offsets[0]
+            self.fp.seek(offset)
+            line = self.fp.readline()
+        return json.loads(line)['response']
+
+    def _write(self, key, info, resp):
+        entry = json.dumps({
+            'request': info,
+            'response': {
+                'status_code': resp.status_code,
+                'headers': dict(resp.headers),
+                'text': Cassette._redact_response(info['url'], resp.text),
+            },
+        })
+        with self.lock:
+            self.fp.write('{{"key": "{!s}", {!s}\n'.format(key, entry[1:]).encode('utf-8'))
+            self.fp.flush()
+
+    def request(self, send, info):
+        """ Returns the response for the request described by `info`. The
+            `send` callable is used to make the actual request unless the
+            cassette is being replayed.
+        """
+        key = Cassette.key(info)
+        if self.replaying:
+            recorded = self._read(key)
+            if recorded is None:
+                raise CassetteError('No recorded response in {!s} for {!s} {!s}'.format(
+                    self.path, info['method'], info['url'],
+                ))
+            return CassetteResponse(url=info['url'], **recorded)
+        resp = send()
+        self._write(key, info, resp)
+        return resp
+
+    def close(self):
+        self.fp.close()
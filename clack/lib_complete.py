@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+
+# Nothing heavy may be imported here: this module answers the completion
+# requests of the shell, which happen on every <TAB>.
+
+# The name of the app, which names the directory of the config file.
+APP_NAME = 'Clack'
+COMPLETE_VAR = '_CLACK_COMPLETE'
+INDEX_NAME = 'completion.json'
+MAX_ENDPOINTS = 500
+
+MS1_ENDPOINTS = [
+    'accounts/show',
+    'accounts/update',
+    'accounts/tags/list',
+    'accounts/usage/list',
+    'channels/create',
+    'channels/delete',
+    'channels/list',
+    'channels/show',
+    'channels/update',
+    'channels/videos/create',
+    'channels/videos/delete',
+    'channels/videos/list',
+    'players/create',
+    'players/delete',
+    'players/list',
+    'players/show',
+    'players/update',
+    'videos/conversions/create',
+    'videos/conversions/delete',
+    'videos/conversions/list',
+    'videos/conversions/show',
+    'videos/create',
+    'videos/delete',
+    'videos/list',
+    'videos/show',
+    'videos/thumbnails/show',
+    'videos/thumbnails/update',
+    'videos/update',
+]
+
+SCRIPTS = {
+    'bash': """_clack_completion() {
+    local IFS=$'\\n'
+    COMPREPLY=( $(env COMP_WORDS="${COMP_WORDS[*]}" COMP_CWORD=$COMP_CWORD %(var)s=bash_complete $1) )
+    return 0
+}
+complete -o default -F _clack_completion %(prog)s
+""",
+    'zsh': """autoload -U +X bashcompinit && bashcompinit
+_clack_completion() {
+    local IFS=$'\\n'
+    COMPREPLY=( $(env COMP_WORDS="${COMP_WORDS[*]}" COMP_CWORD=$COMP_CWORD %(var)s=bash_complete $1) )
+    return 0
+}
+complete -o default -F _clack_completion %(prog)s
+""",
+    'fish': """complete -c %(prog)s -a "(env COMP_WORDS=(commandline -cp) COMP_CWORD=(commandline -t) %(var)s=fish_complete %(prog)s)"
+""",
+}
+
+
+def app_dir():
+    """ Returns the directory with the config file without importing click. It
+        is the same as click.get_app_dir(APP_NAME, force_posix=True), which the
+        Environment uses.
+    """
+    return os.path.expanduser('~/.{!s}'.format('-'.join(APP_NAME.split()).lower()))
+
+
+def index_path():
+    return os.path.join(app_dir(), INDEX_NAME)
+
+
+def _config_mtime():
+    try:
+        return os.path.getmtime(os.path.join(app_dir(), 'config.ini'))
+    except OSError:
+        return None
+
+
+def _read_index():
+    try:
+        with open(index_path(), 'r') as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _write_index(index):
+    if not os.path.isdir(app_dir()):
+        return
+    # Another shell may be completing at the same time.
+    tmp_path = '{!s}.{!s}'.format(index_path(), os.getpid())
+    try:
+        with open(tmp_path, 'w') as fp:
+            json.dump(index, fp)
+        os.rename(tmp_path, index_path())
+    except (IOError, OSError):
+        pass
+
+
+def _param_kind(param):
+    """ Returns what the value of an option or argument is completed with: a
+        list of choices, 'env', 'endpoint' or None for files.
+    """
+    if param.name in ('env', 'name'):
+        return 'env'
+    elif param.name in ('apicall', 'pipe_to'):
+        return 'endpoint'
+    return sorted(getattr(param.type, 'choices', None) or []) or None
+
+
+def command_index(command, path=''):
+    """ Returns the subcommands, options and arguments of a click `command`
+        and all its subcommands, keyed by the path of the command.
+    """
+    node = {'commands': [], 'options': ['--help'], 'values': {}, 'arguments': []}
+    for param in command.params:
+        if param.param_type_name == 'argument':
+            node['arguments'].append(_param_kind(param))
+            continue
+        for opt in param.opts + param.secondary_opts:
+            node['options'].append(opt)
+            if not param.is_flag and not getattr(param, 'count', False):
+                node['values'][opt] = _param_kind(param)
+    index = {path: node}
+    for name, subcommand in sorted(getattr(command, 'commands', {}).items()):
+        if getattr(subcommand, 'hidden', False):
+            continue
+        node['commands'].append(name)
+        index.update(command_index(subcommand, (path + ' ' + name).strip()))
+    node['options'].sort()
+    return index
+
+
+def _envs():
+    """ Returns the api of every set of settings and the default settings,
+        read from the config file.
+    """
+    import configparser
+    config = configparser.RawConfigParser(allow_no_value=True)
+    config.read([os.path.join(app_dir(), 'config.ini')])
+    envs = dict([(s, config.get(s, 'api', fallback='ms1')) for s in config.sections() if s != 'etc'])
+    default = config.get('etc', 'env', fallback=config.get('etc', 'default', fallback=None))
+    return envs, default if default in envs else (sorted(envs)[0] if envs else None)
+
+
+def load_index():
+    """ Returns the completion index. It is rebuilt when clack was upgraded and
+        the settings are read again when the config file has changed.
+    """
+    from .version import VERSION
+    index = _read_index()
+    changed = False
+    cli_mtime = os.path.getmtime(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py'))
+    if index.get('version') != VERSION or index.get('cli_mtime') != cli_mtime:
+        # Only needed once per version of clack, so this may be slow.
+        from .cli import clack
+        index.update({'version': VERSION, 'cli_mtime': cli_mtime, 'commands': command_index(clack)})
+        changed = True
+    if 'config_mtime' not in index or index['config_mtime'] != _config_mtime():
+        index['envs'], index['default_env'] = _envs()
+        index['config_mtime'] = _config_mtime()
+        changed = True
+    if changed:
+        _write_index(index)
+    return index
+
+
+def remember_endpoint(api, endpoint):
+    """ Add an endpoint that was called to the endpoints that are completed for
+        `api`.
+    """
+    endpoint = endpoint.strip('/ ')
+    if not endpoint or '<<' in endpoint or (api == 'ms1' and endpoint in MS1_ENDPOINTS):
+        return
+    index = _read_index()
+    endpoints = index.setdefault('endpoints', {}).setdefault(api, [])
+    if endpoint not in endpoints:
+        endpoints.append(endpoint)
+        del endpoints[:-MAX_ENDPOINTS]
+        _write_index(index)
+
+
+def _find_command(commands, name):
+    """ Returns the subcommand `name` or the only one it is a prefix of.
+    """
+    if name in commands:
+        return name
+    matches = [c for c in commands if c.startswith(name)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def complete(index, args, incomplete):
+    """ Returns the completions of `incomplete`, the word that is being
+        completed, after the words `args` on the command line.
+    """
+    commands = index['commands']
+    path, node, env, num_arguments = '', commands[''], None, 0
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in node['values']:
+            if node['values'][arg] == 'env' and i + 1 < len(args):
+                env = args[i + 1]
+            i += 2
+            continue
+        elif arg.startswith('-'):
+            pass
+        elif node['commands'] and _find_command(node['commands'], arg):
+            path = (path + ' ' + _find_command(node['commands'], arg)).strip()
+            node = commands[path]
+        else:
+            num_arguments += 1
+        i += 1
+    if args and args[-1] in node['values']:
+        kind = node['values'][args[-1]]
+    elif incomplete.startswith('-'):
+        kind = node['options']
+    elif node['commands']:
+        kind = node['commands']
+    else:
+        kind = node['arguments'][num_arguments] if num_arguments < len(node['arguments']) else None
+    if kind == 'env':
+        candidates = sorted(index['envs'])
+    elif kind == 'endpoint':
+        api = index['envs'].get(env or index['default_env'], 'ms1')
+        candidates = sorted(set((MS1_ENDPOINTS if api == 'ms1' else []) + index.get('endpoints', {}).get(api, [])))
+        if incomplete.startswith('/'):
+            candidates = ['/' + c for c in candidates]
+    else:
+        candidates = kind or []
+    return [c for c in candidates if c.startswith(incomplete)]
+
+
+def complete_from_env():
+    """ Answers a completion request of the shell, or prints the script that
+        enables completion. Returns False if clack wasn't invoked for that.
+    """
+    instruction = os.environ.get(COMPLETE_VAR)
+    if not instruction:
+        return False
+    prog = os.path.basename(sys.argv[0]) if not sys.argv[0].endswith('.py') else 'clack'
+    shell, _, action = instruction.partition('_')
+    if action == 'source' and shell in SCRIPTS:
+        sys.stdout.write(SCRIPTS[shell] % {'var': COMPLETE_VAR, 'prog': prog})
+        return True
+    if shell == 'fish':
+        words = os.environ.get('COMP_WORDS', '').split()
+        incomplete = os.environ.get('COMP_CWORD', '')
+        args = words[1:-1] if incomplete and words else words[1:]
+    else:
+        words = os.environ.get('COMP_WORDS', '').split('\n')
+        cword = int(os.environ.get('COMP_CWORD') or 0)
+        args = words[1:cword]
+        incomplete = words[cword] if cword < len(words) else ''
+    candidates = complete(load_index(), args, incomplete)
+    if candidates:
+        sys.stdout.write('\n'.join(candidates) + '\n')
+    return True
@@ -0,0 +1,60 @@
+import ast
+import operator
+import re
+
+CONDITION = re.compile(r'^\s*(?P<path>[\w.*\-]*?)\s*(?P<op>==|!=|<=|>=|<|>)\s*(?P<value>.*?)\s*$')
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+class ConditionError(Exception):
+
+    def __init__(self, message):
+        super(ConditionError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class Condition(object):
+    """ A condition like "video.status == ready" on a (filtered) response. The
+        path is in the notation of --filter-response and may be left out to
+        compare the response itself. The value is a python literal, or a plain
+        string if it isn't one.
+    """
+
+    def __init__(self, source):
+        match = CONDITION.match(source)
+        if not match:
+            raise ConditionError("Not a valid condition: {!s}".format(source))
+        self.source = source
+        self.path = match.group('path').strip('.')
+        self.compare = OPERATORS[match.group('op')]
+        try:
+            self.value = ast.literal_eval(match.group('value'))
+        except (ValueError, SyntaxError):
+            self.value = match.group('value')
+
+    def matches(self, resp, filter_response):
+        """ Returns True if the condition holds for `resp`. `filter_response`
+            is used to find the value at the path of the condition.
+        """
+        actual = filter_response(resp, path=self.path) if self.path else resp
+        # Numbers are often returned as strings.
+        if isinstance(self.value, (int, float)) and not isinstance(self.value, bool):
+            try:
+                actual = float(actual)
+            except (TypeError, ValueError):
+                return False
+        try:
+            return self.compare(actual, self.value)
+        except TypeError:
+            return False
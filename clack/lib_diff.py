@@ -0,0 +1,109 @@
+import json
+
+from collections import OrderedDict
+
+
+def format_path(path):
+    """ Returns `path` in the same dotted notation as --filter-response.
+    """
+    return ".".join(["{!s}".format(key) for key in path]) or "."
+
+
+def diff(old, new, path=()):
+    """ Yields the structural differences between `old` and `new` as tuples of
+        an operation ('added', 'removed' or 'changed'), the path of the value
+        and the old and new value. Dicts are compared key by key and lists item
+        by item.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new)):
+            if key not in new:
+                yield 'removed', path + (key,), old[key], None
+            elif key not in old:
+                yield 'added', path + (key,), None, new[key]
+            else:
+                for change in diff(old[key], new[key], path + (key,)):
+                    yield change
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in range(max(len(old), len(new))):
+            if i >= len(new):
+                yield 'removed', path + (i,), old[i], None
+            elif i >= len(old):
+                yield 'added', path + (i,), None, new[i]
+            else:
+                for change in diff(old[i], new[i], path + (i,)):
+                    yield change
+    elif old != new:
+        yield 'changed', path, old, new
+
+
+def format_change(change):
+    """ Returns a change that was yielded by `diff` as a single line.
+    """
+    op, path, old, new = change
+    dumps = lambda value: json.dumps(value, sort_keys=True, ensure_ascii=False)
+    if op == 'added':
+        return "+ {!s}: {!s}".format(format_path(path), dumps(new))
+    elif op == 'removed':
+        return "- {!s}: {!s}".format(format_path(path), dumps(old))
+    return "~ {!s}: {!s} -> {!s}".format(format_path(path), dumps(old), dumps(new))
+
+
+def lookup(record, path):
+    """ Returns the value at `path` (in the notation of --filter-response) in
+        `record`, or None if there is no such value.
+    """
+    for part in path.split('.'):
+        if isinstance(record, dict):
+            record = record.get(part)
+        elif isinstance(record, list) and part.isdigit() and int(part) < len(record):
+            record = record[int(part)]
+        else:
+            return None
+    return record
+
+
+def align(old, new, key_path=None, window=10000):
+    """ Pairs the records of two streams of (position, record) tuples by the
+        value at `key_path` and yields tuples of the key, the old and the new
+        record. The old or new record is None if a record is only in one of the
+        streams. Records are paired by position if there is no key path.
+
+        Both streams are read at the same pace and only records that haven't
+        been paired yet are kept, at most `window` per stream. Records should
+        therefore be in roughly the same order: a record that isn't paired
+        while `window` more records of its stream come in, is reported as
+        removed or added.
+    """
+    def key(position, record):
+        value = position if key_path is None else lookup(record, key_path)
+        return json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value
+
+    pending = (OrderedDict(), OrderedDict())
+    streams = [iter(old), iter(new)]
+    while any(streams):
+        for side, stream in enumerate(streams):
+            if stream is None:
+                continue
+            try:
+                position, record = next(stream)
+            except StopIteration:
+                streams[side] = None
+                continue
+            k = key(position, record)
+            others = pending[1 - side]
+            if k in others:
+                other = others.pop(k)
+                yield (k, record, other) if side == 0 else (k, other, record)
+                continue
+            if k in pending[side]:
+                # A duplicate key: the record that came first has no match.
+                yield (k, pending[side].pop(k), None) if side == 0 else (k, None, pending[side].pop(k))
+            pending[side][k] = record
+            if len(pending[side]) > window:
+                k, record = pending[side].popitem(last=False)
+                yield (k, record, None) if side == 0 else (k, None, record)
+    for k, record in pending[0].items():
+        yield k, record, None
+    for k, record in pending[1].items():
+        yield k, None, record
@@ -0,0 +1,200 @@
+import bz2
+import csv
+import gzip
+import itertools
+import json
+import os
+import sys
+
+from collections import OrderedDict
+
+try:
+    import lzma
+except ImportError:
+    lzma = None  # Compiled w/o xz support
+
+INPUT_FORMATS = ['csv', 'tsv', 'jsonl']
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.tab': 'tsv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.json': 'jsonl',
+}
+
+
+class InputError(Exception):
+
+    def __init__(self, message):
+        super(InputError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+
+def is_rereadable(path):
+    """ Returns True if the input can be read more than once.
+    """
+    return path != '-'
+
+
+def is_shardable(path):
+    """ Returns True if the input can be split in byte ranges.
+    """
+    return is_rereadable(path) and not path.endswith(COMPRESSED_EXTENSIONS)
+
+
+def open_input(path):
+    """ Open a (compressed) utf-8 input file for reading as text. Use '-' for
+        stdin.
+    """
+    if path == '-':
+        return sys.stdin
+    elif path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    elif path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8', newline='')
+    elif path.endswith('.xz'):
+        if lzma is None:
+            raise InputError('Reading xz compressed files needs a python with the lzma module.')
+        return lzma.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def input_format(path, fmt=None):
+    """ Returns the format of the input, based on the extension of `path` if
+        `fmt` is not given.
+    """
+    if fmt is not None:
+        return fmt
+    name = path
+    for ext in COMPRESSED_EXTENSIONS:
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return EXTENSIONS.get(os.path.splitext(name)[1].lower(), 'csv')
+
+
+def shard_ranges(path, num_shards, fmt=None):
+    """ Splits an uncompressed input file in at most `num_shards` byte ranges
+        that start and end at a line boundary. The header row of csv and tsv
+        files is not part of any range. Values with line breaks in them are
+        not supported.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fp:
+        if input_format(path, fmt) != 'jsonl':
+            fp.readline()
+        bounds = [fp.tell()]
+        for i in range(1, num_shards):
+            # Move to the start of the line after the one the offset is in.
+            fp.seek(max(bounds[0] + (size - bounds[0]) * i // num_shards - 1, bounds[-1]))
+            fp.readline()
+            if bounds[-1] < fp.tell() < size:
+                bounds.append(fp.tell())
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if start < end]
+
+
+def _byte_range(fp, start, end):
+    fp.seek(start)
+    while fp.tell() < end:
+        line = fp.readline()
+        if not line:
+            break
+        yield line.decode('utf-8')
+
+
+def _table_rows(fp, delimiter):
+    header_row = None
+    for columns in csv.reader(fp, delimiter=delimiter):
+        if header_row is None:
+            header_row = columns
+            continue
+        if columns:
+            yield columns[0], dict(zip(header_row, columns))
+
+
+def _jsonl_rows(fp):
+    for num, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            values = json.loads(line, object_pairs_hook=OrderedDict)
+        except ValueError:
+            raise InputError('Line {!s} is not valid json.'.format(num))
+        if not isinstance(values, dict):
+            raise InputError('Line {!s} is not a json object.'.format(num))
+        key = next(iter(values.values())) if values else num
+        yield (key if isinstance(key, (str, int, float)) else num), dict(values)
+
+
+def read_rows(path, fmt=None, byte_range=None):
+    """ Yields a key and a dict with values for every row of the input. The key
+        is the value of the first column or field. Rows are read one by one, so
+        inputs of any size can be used. Only the rows of `byte_range` (a range
+        returned by `shard_ranges`) are read if it is given.
+    """
+    fmt = input_format(path, fmt)
+    # Byte ranges are read from the raw file, because offsets in text files are opaque.
+    fp = open_input(path) if byte_range is None else open(path, 'rb')
+    try:
+        lines = fp
+        if byte_range is not None:
+            lines = _byte_range(fp, *byte_range)
+            if fmt != 'jsonl':
+                lines = itertools.chain([fp.readline().decode('utf-8')], lines)
+        if fmt == 'jsonl':
+            for row in _jsonl_rows(lines):
+                yield row
+        else:
+            for row in _table_rows(lines, '\t' if fmt == 'tsv' else ','):
+                yield row
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+
+def _read_document(text, path):
+    try:
+        document = json.loads(text)
+    except ValueError:
+        raise InputError('{!s} is not a valid json lines file or json document.'.format(path))
+    if isinstance(document, dict):
+        return list(document.items())
+    elif isinstance(document, list):
+        return list(enumerate(document))
+    raise InputError('{!s} is not a json array or object.'.format(path))
+
+
+def read_documents(path):
+    """ Yields the position and the json document on every line of a
+        (compressed) json lines file, one at a time. A file with a single json
+        array or object that spans multiple lines, like the output of a batch,
+        is read at once: its items are yielded with their index or key as
+        position. Use '-' for stdin.
+    """
+    fp = open_input(path)
+    try:
+        position = 0
+        for num, line in enumerate(fp, start=1):
+            if not line.strip():
+                continue
+            try:
+                document = json.loads(line)
+            except ValueError:
+                if position == 0 and line.lstrip()[:1] in ('[', '{'):
+                    for item in _read_document(line + fp.read(), path):
+                        yield item
+                    return
+                raise InputError('Line {!s} of {!s} is not valid json.'.format(num, path))
+            yield position, document
+            position += 1
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
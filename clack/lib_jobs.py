@@ -0,0 +1,134 @@
+import errno
+import json
+import os
+import time
+
+JOB_FILE = 'job.json'
+LOG_FILE = 'output.log'
+DB_FILE = 'results.db'
+
+# States of a job that hasn't finished yet.
+ACTIVE_STATES = ('submitted', 'running')
+
+
+class JobError(Exception):
+
+    def __init__(self, message):
+        super(JobError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def is_alive(pid):
+    """ Returns True if a process with `pid` exists.
+    """
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class Job(object):
+    """ A batch call that runs detached from the terminal. Every job has a
+        numbered directory with its arguments and state (job.json), the output
+        of the call (output.log) and its results (results.db).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.id = os.path.basename(path)
+        self.data = {}
+        self.load()
+
+    @staticmethod
+    def create(directory, args, cwd):
+        """ Create a job for the call with `args`, made from directory `cwd`.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        job_id = max([int(name) for name in os.listdir(directory) if name.isdigit()] or [0]) + 1
+        # Another job may be submitted at the same time and claim the same number.
+        while True:
+            try:
+                os.mkdir(os.path.join(directory, "{!s}".format(job_id)))
+                break
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                job_id += 1
+        job = Job(os.path.join(directory, "{!s}".format(job_id)))
+        job.save(args=list(args), cwd=cwd, state='submitted', submitted_at=time.time())
+        return job
+
+    @staticmethod
+    def find(directory, job_id):
+        path = os.path.join(directory, "{!s}".format(job_id))
+        if not os.path.isfile(os.path.join(path, JOB_FILE)):
+            raise JobError('There is no job {!s}.'.format(job_id))
+        return Job(path)
+
+    @staticmethod
+    def all(directory):
+        """ Returns all jobs, oldest first.
+        """
+        if not os.path.isdir(directory):
+            return []
+        names = sorted([name for name in os.listdir(directory) if name.isdigit()], key=int)
+        return [Job(os.path.join(directory, name)) for name in names
+                if os.path.isfile(os.path.join(directory, name, JOB_FILE))]
+
+    @property
+    def log_path(self):
+        return os.path.join(self.path, LOG_FILE)
+
+    @property
+    def db_path(self):
+        return os.path.join(self.path, DB_FILE)
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, JOB_FILE), 'r') as fp:
+                self.data = json.load(fp)
+        except (IOError, ValueError):
+            self.data = {}
+        return self
+
+    def save(self, **kwargs):
+        self.data.update(kwargs)
+        # Write to a temporary file first, so the state is never half written.
+        tmp_path = os.path.join(self.path, '{!s}.{!s}'.format(JOB_FILE, os.getpid()))
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.data, fp, sort_keys=True)
+        os.rename(tmp_path, os.path.join(self.path, JOB_FILE))
+
+    @property
+    def state(self):
+        """ Returns the state of the job. A running job of which the process is
+            gone was killed: it is lost.
+        """
+        state = self.data.get('state')
+        if state == 'running' and not is_alive(self.data.get('pid')):
+            return 'lost'
+        return state
+
+    @property
+    def is_active(self):
+        return self.state in ACTIVE_STATES
+
+    def last_line(self, max_bytes=4096):
+        """ Returns the last line of the output, which is the latest status
+            line while the batch runs.
+        """
+        try:
+            with open(self.log_path, 'rb') as fp:
+                fp.seek(0, os.SEEK_END)
+                fp.seek(max(0, fp.tell() - max_bytes))
+                lines = [line for line in fp.read().decode('utf-8', 'replace').splitlines() if line.strip()]
+        except IOError:
+            return None
+        return lines[-1] if lines else None
@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at REAL,
+        endpoint TEXT,
+        params TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS calls (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER,
+        row_key TEXT,
+        input TEXT,
+        endpoint TEXT,
+        params TEXT,
+        status INTEGER,
+        latency REAL,
+        response TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS calls_job_status ON calls (job_id, status)",
+    "CREATE INDEX IF NOT EXISTS calls_job_latency ON calls (job_id, latency)",
+]
+
+
+class JobStore(object):
+    """ Stores the input and outcome of every call of a batch job in a SQLite
+        database. Calls are written in batches, one transaction per batch.
+    """
+
+    def __init__(self, path, endpoint=None, params=None, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        cursor = self.connection.execute(
+            "INSERT INTO jobs (started_at, endpoint, params) VALUES (?, ?, ?)",
+            (time.time(), endpoint, params),
+        )
+        self.job_id = cursor.lastrowid
+        self.connection.commit()
+
+    @staticmethod
+    def _dumps(value):
+        return json.dumps(value, default=lambda o: "{!s}".format(o))
+
+    def add(self, row_key, values, endpoint, params, status, latency, response):
+        """ Queue the outcome of a single call. The queue is written to the
+            database once it holds `batch_size` calls.
+        """
+        with self.lock:
+            self.pending.append((
+                self.job_id,
+                "{!s}".format(row_key),
+                JobStore._dumps(values),
+                endpoint,
+                JobStore._dumps(params),
+                status,
+                latency,
+                JobStore._dumps(response),
+            ))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        self.connection.executemany(
+            "INSERT INTO calls (job_id, row_key, input, endpoint, params, status, latency, response) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self.pending,
+        )
+        self.connection.commit()
+        self.pending = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    @staticmethod
+    def last_job_id(path):
+        """ Returns the id of the last job in the database at `path`, or None
+            if there is none. A database that doesn't exist is not created.
+        """
+        if not os.path.isfile(path):
+            return None
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute("SELECT MAX(id) FROM jobs").fetchone()[0]
+        except sqlite3.Error:
+            return None
+        finally:
+            connection.close()
+
+    @staticmethod
+    def failed_rows(path, job_id, page_size=500):
+        """ Yields the key and input values of every failed call of a job. The
+            calls are read a page at a time and no cursor stays open between
+            pages, so the retries can be stored in the same database meanwhile.
+        """
+        last_id = 0
+        while True:
+            connection = sqlite3.connect(path)
+            try:
+                page = connection.execute(
+                    "SELECT id, row_key, input FROM calls WHERE job_id = ? AND status != 200 AND id > ? "
+                    "ORDER BY id LIMIT ?",
+                    (job_id, last_id, page_size),
+                ).fetchall()
+            finally:
+                connection.close()
+            for call_id, row_key, values in page:
+                yield row_key, json.loads(values)
+            if len(page) < page_size:
+                return
+            last_id = page[-1][0]
+
+    @staticmethod
+    def _stats(connection, job_id):
+        stats = {}
+        for status, count, avg_latency, max_latency in connection.execute(
+            "SELECT status, COUNT(*), AVG(latency), MAX(latency) FROM calls WHERE job_id = ? GROUP BY status",
+            (job_id,),
+        ):
+            stats["{!s}".format(status)] = {
+                'calls': count,
+                'avg latency': round(avg_latency, 3),
+                'max latency': round(max_latency, 3),
+            }
+        return stats
+
+    def stats(self, job_id=None):
+        """ Returns the number of calls and the latency per status code of a job.
+        """
+        self.flush()
+        return JobStore._stats(self.connection, self.job_id if job_id is None else job_id)
+
+    @staticmethod
+    def read_stats(path):
+        """ Returns the stats of the last job in the database at `path`, while
+            another process may still be adding calls to it.
+        """
+        job_id = JobStore.last_job_id(path)
+        if job_id is None:
+            return {}
+        connection = sqlite3.connect(path, timeout=10)
+        try:
+            return JobStore._stats(connection, job_id)
+        finally:
+            connection.close()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,195 @@
+import errno
+import json
+import os
+import socket
+import threading
+import time
+
+from contextlib import contextmanager
+
+JOB_FILE = 'job.json'
+RESULTS_PREFIX = 'results-'
+RESULTS_EXT = '.jsonl'
+
+
+class LeaseError(Exception):
+
+    def __init__(self, message):
+        super(LeaseError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class LeaseDir(object):
+    """ Coordinates the work of clack instances on different hosts through a
+        shared directory. The work is split in numbered chunks. An instance
+        claims a chunk by creating its lease file, which only one instance can
+        do. The lease is renewed while the instance works on the chunk, so
+        leases that haven't been renewed for `ttl` seconds belong to an instance
+        that stopped and are taken over by others.
+
+        Finished chunks get a done file with the name of the instance that
+        finished it first. Only the results of that instance count, so a chunk
+        that was done twice is never merged twice.
+    """
+
+    def __init__(self, path, ttl=300, instance=None):
+        self.path = path
+        self.ttl = ttl
+        self.instance = instance or '{!s}-{!s}'.format(socket.gethostname(), os.getpid())
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _file(self, chunk, ext):
+        return os.path.join(self.path, 'chunk-{:06d}.{!s}'.format(chunk, ext))
+
+    @staticmethod
+    def _create(path, content):
+        """ Create a file that doesn't exist yet. Returns False if it exists.
+        """
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                return False
+            raise
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(content)
+        return True
+
+    @staticmethod
+    def job(path):
+        """ Returns the description of the job in the lease directory `path`.
+        """
+        try:
+            with open(os.path.join(path, JOB_FILE), 'r') as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return None
+
+    def join(self, job):
+        """ Register `job` in the directory, or check that the directory holds
+            the same job if another instance registered it first.
+        """
+        job = json.loads(json.dumps(job))
+        path = os.path.join(self.path, JOB_FILE)
+        tmp_path = '{!s}.{!s}'.format(path, self.instance)
+        with open(tmp_path, 'w') as fp:
+            json.dump(job, fp, sort_keys=True)
+        try:
+            # Linking is atomic, so other instances never see a half written file.
+            os.link(tmp_path, path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        finally:
+            os.remove(tmp_path)
+        if LeaseDir.job(self.path) != job:
+            raise LeaseError('The lease directory {!s} is used for another job (input, endpoint or params '
+                             'differ).'.format(self.path))
+
+    def is_done(self, chunk):
+        return os.path.exists(self._file(chunk, 'done'))
+
+    def done_by(self, chunk):
+        """ Returns the name of the instance that finished the chunk.
+        """
+        try:
+            with open(self._file(chunk, 'done'), 'r') as fp:
+                return fp.read()
+        except IOError:
+            return None
+
+    def claim(self, chunk):
+        """ Returns True if this instance may work on the chunk.
+        """
+        if self.is_done(chunk):
+            return False
+        lease = self._file(chunk, 'lease')
+        try:
+            age = time.time() - os.path.getmtime(lease)
+        except OSError:
+            age = None
+        if age is not None:
+            if age < self.ttl:
+                return False
+            # Take over a stale lease. Only one instance can move it away.
+            stale = '{!s}.stale-{!s}'.format(lease, self.instance)
+            try:
+                os.rename(lease, stale)
+            except OSError:
+                return False
+            if time.time() - os.path.getmtime(stale) < self.ttl:
+                # Another instance took it over just before us.
+                os.rename(stale, lease)
+                return False
+            os.remove(stale)
+        if not LeaseDir._create(lease, self.instance):
+            return False
+        if self.is_done(chunk):
+            self.release(chunk)
+            return False
+        return True
+
+    def release(self, chunk):
+        try:
+            os.remove(self._file(chunk, 'lease'))
+        except OSError:
+            pass
+
+    @contextmanager
+    def keep(self, chunk):
+        """ Renew the lease of the chunk in the background while the block runs.
+        """
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.ttl / 3.0):
+                try:
+                    os.utime(self._file(chunk, 'lease'), None)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=renew)
+        thread.daemon = True
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def complete(self, chunk):
+        """ Mark the chunk as done. Returns False if another instance finished
+            it first.
+        """
+        done = LeaseDir._create(self._file(chunk, 'done'), self.instance)
+        self.release(chunk)
+        return done
+
+    def results_path(self, instance=None):
+        return os.path.join(self.path, '{!s}{!s}{!s}'.format(RESULTS_PREFIX, instance or self.instance, RESULTS_EXT))
+
+    def results_paths(self):
+        """ Yields the instance name and path of the results of every instance.
+        """
+        for name in sorted(os.listdir(self.path)):
+            if name.startswith(RESULTS_PREFIX) and name.endswith(RESULTS_EXT):
+                yield name[len(RESULTS_PREFIX):-len(RESULTS_EXT)], os.path.join(self.path, name)
+
+    def status(self, num_chunks):
+        """ Returns the number of chunks that are done, leased and pending.
+        """
+        status = {'done': 0, 'leased': 0, 'pending': 0}
+        for chunk in range(num_chunks):
+            if self.is_done(chunk):
+                status['done'] += 1
+            elif os.path.exists(self._file(chunk, 'lease')):
+                status['leased'] += 1
+            else:
+                status['pending'] += 1
+        return status
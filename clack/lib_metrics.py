@@ -0,0 +1,177 @@
+import os
+import threading
+
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'clack_requests_total': ('counter', 'Requests made, by status code (0 for connection errors).'),
+    'clack_request_duration_seconds': ('histogram', 'Latency of requests in seconds.'),
+    'clack_request_bytes_total': ('counter', 'Bytes of response bodies and uploaded chunks.'),
+    'clack_request_wire_bytes_total': ('counter', 'Bytes of response bodies and uploaded chunks on the wire, '
+                                                  'after compression.'),
+    'clack_retries_total': ('counter', 'Requests that were retries of a failed request.'),
+    'clack_in_flight_calls': ('gauge', 'Calls of a batch that are in flight.'),
+    'clack_concurrency_limit': ('gauge', 'Maximum number of calls of a batch in flight.'),
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda value: "{!s}".format(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(['{!s}="{!s}"'.format(k, escape(v)) for k, v in pairs]) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else "{!s}".format(value)
+
+
+class Metrics(object):
+    """ Counters, histograms and gauges of the requests that clack makes,
+        rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, _labels(labels))
+        with self.lock:
+            buckets, total, count = self.histograms.get(key, ([0] * len(DURATION_BUCKETS), 0.0, 0))
+            buckets = [n + 1 if value <= bound else n for n, bound in zip(buckets, DURATION_BUCKETS)]
+            self.histograms[key] = (buckets, total + value, count + 1)
+
+    def gauge(self, name, fn):
+        """ Register a gauge. Its value is the outcome of `fn` at the time the
+            metrics are rendered.
+        """
+        with self.lock:
+            self.gauges[name] = fn
+
+    def observe_request(self, api, env, method, status, latency, num_bytes, attempt=0, wire_bytes=None):
+        labels = {'api': api, 'env': env}
+        self.inc('clack_requests_total', dict(labels, method=method, status=status))
+        self.observe('clack_request_duration_seconds', labels, latency)
+        self.inc('clack_request_bytes_total', labels, num_bytes)
+        self.inc('clack_request_wire_bytes_total', labels, num_bytes if wire_bytes is None else wire_bytes)
+        if attempt:
+            self.inc('clack_retries_total', labels)
+
+    def dump(self):
+        """ Returns the counters and histograms as a json serializable value.
+        """
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(h)] for (name, labels), h in self.histograms.items()],
+            }
+
+    def merge(self, state):
+        """ Add the counters and histograms of a `dump` (of another process).
+        """
+        with self.lock:
+            for name, labels, value in state['counters']:
+                key = (name, tuple([tuple(pair) for pair in labels]))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, (buckets, total, count) in state['histograms']:
+                key = (name, tuple([tuple(pair) for pair in labels]))
+                old_buckets, old_total, old_count = self.histograms.get(key, ([0] * len(DURATION_BUCKETS), 0.0, 0))
+                self.histograms[key] = ([a + b for a, b in zip(old_buckets, buckets)], old_total + total,
+                                        old_count + count)
+
+    def render(self):
+        with self.lock:
+            series = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                series.setdefault(name, []).append('{!s}{!s} {!s}'.format(name, _format_labels(labels), value))
+            for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+                lines = series.setdefault(name, [])
+                for bound, n in zip(DURATION_BUCKETS, buckets):
+                    lines.append('{!s}_bucket{!s} {!s}'.format(name, _format_labels(labels, [('le', bound)]), n))
+                lines.append('{!s}_bucket{!s} {!s}'.format(name, _format_labels(labels, [('le', '+Inf')]), count))
+                lines.append('{!s}_sum{!s} {!s}'.format(name, _format_labels(labels), _format_value(total)))
+                lines.append('{!s}_count{!s} {!s}'.format(name, _format_labels(labels), count))
+            for name, fn in self.gauges.items():
+                series.setdefault(name, []).append('{!s} {!s}'.format(name, _format_value(fn())))
+        output = []
+        for name in sorted(series):
+            kind, help_text = METRICS[name]
+            output.append('# HELP {!s} {!s}'.format(name, help_text))
+            output.append('# TYPE {!s} {!s}'.format(name, kind))
+            output.extend(series[name])
+        return '\n'.join(output) + '\n'
+
+
+class MetricsExporter(object):
+    """ Writes the metrics to a file for the textfile collector of the node
+        exporter every `interval` seconds and when it's closed, and serves them
+        on a local port if one is given.
+    """
+
+    def __init__(self, metrics, path=None, port=None, interval=10):
+        self.metrics = metrics
+        self.path = path
+        self.stop = threading.Event()
+        self.server = None
+        # The port is taken first, so nothing is started if it's in use.
+        if port is not None:
+            self.server = HTTPServer(('127.0.0.1', port), self._handler())
+            thread = threading.Thread(target=self.server.serve_forever)
+            thread.daemon = True
+            thread.start()
+        if path is not None:
+            thread = threading.Thread(target=self._write_periodically, args=(interval,))
+            thread.daemon = True
+            thread.start()
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', "{!s}".format(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _write_periodically(self, interval):
+        while not self.stop.wait(interval):
+            self.write()
+
+    def write(self):
+        # The collector should never read a half written file.
+        tmp_path = '{!s}.{!s}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as fp:
+            fp.write(self.metrics.render())
+        os.rename(tmp_path, self.path)
+
+    def close(self):
+        self.stop.set()
+        if self.path is not None:
+            self.write()
+        if self.server is not None:
+            self.server.shutdown()
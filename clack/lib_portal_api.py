@@ -1,6 +1,20 @@
+import gzip
 import json
 import re
 import requests
+import threading
+import time
+
+from .lib_cassette import Cassette
+from .lib_cassette import CassetteError
+from .lib_requestlog import params_hash
+from .lib_requestlog import wire_bytes
+
+# The encodings of responses that clack asks for.
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# Request bodies of at least this number of bytes are compressed, if enabled.
+COMPRESS_MIN_SIZE = 16 * 1024
 
 
 class PortalAPIError(Exception):
@@ -27,49 +41,134 @@ class PortalAPIError(Exception):
 
 
 class PortalAPI(object):
+    """ Client of the account api. A client can be shared by many threads: the
+        session and its tokens belong to the client and only one thread starts
+        a (new) session while the others wait for it.
+    """
 
     verify = True
-    tokens = {
-        'account': None,
-        'site': None,
-        'user': None,
-    }
 
     def __init__(self, username=None, password=None, signature=None, api_url='https://api.jwplayer.com',
-                 is_admin=False, verify=True):
+                 is_admin=False, verify=True, cassette=None, cache=None, request_log=None, pool_size=10,
+                 compress_requests=False):
         self.username = username
         self.password = password
         self.signature = signature
+        # A given signature (of a user session) can't be renewed with our credentials.
+        self.renewable = signature is None
+        self.tokens = {
+            'account': None,
+            'site': None,
+            'user': None,
+        }
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        self.compress_requests = compress_requests
         self.api_url = api_url[:-1] if api_url.endswith('/') else api_url
         self.is_admin = is_admin
         self.verify = verify
+        self.cassette = cassette
+        self.cache = cache
+        self.request_log = request_log
         if not self.verify:
             # Suppress InsecureRequestWarnings
             requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
-    def _call(self, method, endpoint, params=None, data=None, headers={}, auth=True, raw_response=False):
+    def _call(self, method, endpoint, params=None, data=None, headers=None, auth=True, raw_response=False):
+        # Fresh cached responses don't need a session, unless the endpoint
+        # needs the tokens that come with it.
+        if self.cache is not None and method == 'get' and not re.search(r'<\w+>', endpoint):
+            info = Cassette.request_info('ac2', 'GET', self._url(endpoint), params=params, data=data)
+            resp = self.cache.lookup(info, scope=self.username)
+            if resp is not None:
+                return resp if raw_response else resp.json()['return_value']
+        headers = dict(headers or {}, **{'content-type': 'application/json'})
+        signature = None
         if auth:
-            if self.signature is None:
-                self.init_session()
-            headers['Authorization'] = self.signature
-        headers['content-type'] = 'application/json'
-        resp = requests.request(
-            method.upper(),
-            self._url(endpoint),
-            data=data,
-            params=params,
-            headers=headers,
-            verify=self.verify,
-        )
+            signature = self._signature()
+            headers['Authorization'] = signature
+        resp = self._send(method.upper(), self._url(endpoint), data=data, params=params, headers=headers)
+        if auth and resp.status_code == 401 and self.renewable:
+            # The session expired, start a new one and try again once.
+            headers['Authorization'] = self._signature(expired=signature)
+            resp = self._send(method.upper(), self._url(endpoint), data=data, params=params, headers=headers,
+                              attempt=1)
         if raw_response:
             return resp
         elif resp.status_code == 200:
             resp = resp.json()
-            self.signature = resp['return_value'].get('signature')
+            if auth and resp['return_value'].get('signature'):
+                with self.lock:
+                    self.signature = resp['return_value']['signature']
             return resp['return_value']
         else:
             raise PortalAPIError(resp=resp)
 
+    def _signature(self, expired=None):
+        """ Returns the signature of the session, starting a session if there is
+            none yet or if the current one is the `expired` signature. Threads
+            that need a session at the same time wait for a single new session.
+        """
+        with self.lock:
+            if self.signature is None or (expired is not None and self.signature == expired):
+                self.signature = None
+                self.init_session()
+            return self.signature
+
+    def _send(self, method, url, data=None, params=None, headers=None, attempt=0):
+        info = Cassette.request_info('ac2', method, url, params=params, data=data)
+
+        def send(conditional=None):
+            all_headers = dict(headers or {}, **(conditional or {}))
+            if self.cassette is not None:
+                return self.cassette.request(
+                    lambda: self._request(method, url, data, params, all_headers, attempt), info,
+                )
+            return self._request(method, url, data, params, all_headers, attempt)
+        try:
+            if self.cache is not None and method == 'GET':
+                return self.cache.request(send, info, scope=self.username)
+            return send()
+        except CassetteError as e:
+            raise PortalAPIError(message=e.message, code='cassette_miss')
+
+    def _request(self, method, url, data, params, headers, attempt=0):
+        """ Make a request. `attempt` is the number of times the request was
+            made before, e.g. without a compressed body or with an expired
+            session.
+        """
+        encoded = None if data is None else data.encode('utf-8')
+        compress = encoded is not None and self.compress_requests and len(encoded) >= COMPRESS_MIN_SIZE
+        body = gzip.compress(encoded) if compress else encoded
+        started = time.time()
+        status, num_bytes, fields = 0, 0, {}
+        try:
+            resp = self.session.request(
+                method, url, data=body, params=params, verify=self.verify,
+                headers=dict(headers, **{'Content-Encoding': 'gzip'}) if compress else headers,
+            )
+            status, num_bytes = resp.status_code, len(resp.content)
+            fields['wire_bytes'] = wire_bytes(resp)
+        finally:
+            if self.request_log is not None:
+                if attempt:
+                    fields['attempt'] = attempt
+                if data is not None:
+                    fields.update(body_bytes=len(encoded), body_wire_bytes=len(body))
+                # The hash is of the redacted request, so credentials can't be guessed from it.
+                redacted = Cassette.request_info('ac2', method, url, params=params, data=data)
+                self.request_log(method, url, status, time.time() - started, num_bytes,
+                                 params_hash=params_hash(redacted['params'], redacted['data']), **fields)
+        if compress and resp.status_code == 415:
+            # The server doesn't accept compressed bodies, send them as they are from now on.
+            self.compress_requests = False
+            return self._request(method, url, data, params, headers, attempt + 1)
+        return resp
+
     def _url(self, endpoint):
         endpoint = endpoint.strip('/ ')
         if not endpoint.startswith('v2/'):
@@ -92,11 +191,12 @@ class PortalAPI(object):
                 'userEmail': self.username,
                 'userPassword': self.password,
             }, auth=False)
+            self.signature = resp.get('signature')
             # Set useful tokens for autoreplacing.
             try:
-                self.tokens['account'] = resp['accounts'].keys()[0]
+                self.tokens['account'] = list(resp['accounts'])[0]
                 self.tokens['user'] = resp['user']['userToken']
-                self.tokens['site'] = resp['accounts'][self.tokens['account']]['sites'].keys()[0]
+                self.tokens['site'] = list(resp['accounts'][self.tokens['account']]['sites'])[0]
             except (KeyError, IndexError):
                 raise PortalAPIError(message="The default tokens for this user could not be found in the "
                                              "session start response.")
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from queue import Empty
+from queue import Queue
+from urllib.parse import urlparse
+
+_STOP = object()
+
+
+def params_hash(params=None, data=None):
+    """ Returns a hash of the params and body of a request, so requests can be
+        compared without logging their (possibly secret) content.
+    """
+    if params is None and data is None:
+        return None
+    text = json.dumps([params, data], sort_keys=True, default=lambda o: "{!s}".format(o))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def wire_bytes(resp):
+    """ Returns the number of bytes of the body of `resp` as it came over the
+        wire. This is less than the length of its content if it was compressed.
+    """
+    try:
+        return resp.raw.tell()
+    except AttributeError:
+        return len(resp.content)
+
+
+class RequestLog(object):
+    """ Writes an entry for every request to a JSON lines file. Entries are
+        queued and written by a background thread, as many at once as there
+        are queued, so logging doesn't slow down the requests themselves.
+    """
+
+    def __init__(self, path, max_queued=100000, max_batch=1000):
+        self.path = path
+        self.max_batch = max_batch
+        self.queue = Queue(maxsize=max_queued)
+        self.closed = False
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def log(self, method, url, status, latency, num_bytes, **fields):
+        """ Queue an entry for a request.
+        """
+        entry = {
+            'timestamp': round(time.time(), 6),
+            'method': method,
+            'endpoint': urlparse(url).path,
+            'status': status,
+            'latency': round(latency, 6),
+            'bytes': num_bytes,
+        }
+        entry.update(fields)
+        self.queue.put(entry)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+            lines = []
+            for entry in batch:
+                if entry is _STOP:
+                    stop = True
+                else:
+                    lines.append(json.dumps(entry, sort_keys=True) + '\n')
+            data = ''.join(lines).encode('utf-8')
+            while data:
+                data = data[os.write(self.fd, data):]
+
+    def close(self):
+        """ Write all queued entries and close the file.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+        os.close(self.fd)
@@ -0,0 +1,109 @@
+import shutil
+import sys
+import threading
+import time
+
+from collections import deque
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '{:d}:{:02d}:{:02d}'.format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    return '{:d}:{:02d}'.format(seconds // 60, seconds % 60)
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class BatchStatus(object):
+    """ Shows how a batch is doing: the calls per second, p50 and p99 latency
+        and error rate of the last `window` seconds, the calls in flight and
+        the time left at the current rate. Recording a call only appends it to
+        the window; a background thread redraws the status line every
+        `interval` seconds, or logs it every `log_interval` seconds if the
+        status cannot be `live`.
+    """
+
+    def __init__(self, total=None, in_flight=None, live=True, stream=None, interval=0.25, log_interval=10.0,
+                 window=10.0):
+        self.total = total
+        self.in_flight = in_flight
+        self.live = live
+        self.stream = sys.stderr if stream is None else stream
+        self.interval = interval if live else log_interval
+        self.window = window
+        self.lock = threading.Lock()
+        self.calls = deque()
+        self.done = 0
+        self.failed = 0
+        self.started = time.time()
+        self.stop = threading.Event()
+        self.thread = None
+
+    def record(self, latency, failed=False):
+        """ Record a call that finished.
+        """
+        with self.lock:
+            self.calls.append((time.time(), latency, failed))
+            self.done += 1
+            self.failed += 1 if failed else 0
+
+    def line(self):
+        """ Returns the status as a single line.
+        """
+        now = time.time()
+        with self.lock:
+            while self.calls and self.calls[0][0] < now - self.window:
+                self.calls.popleft()
+            calls = list(self.calls)
+            done, failed = self.done, self.failed
+        # The rate is based on the window, or the time so far when the batch just started.
+        elapsed = min(self.window, now - self.started)
+        rate = len(calls) / elapsed if elapsed > 0 else 0.0
+        parts = ['{!s}{!s} calls'.format(done, '/{!s}'.format(self.total) if self.total else '')]
+        parts.append('{:.1f}/s'.format(rate))
+        if calls:
+            latencies = sorted([call[1] for call in calls])
+            parts.append('p50 {:.0f}ms p99 {:.0f}ms'.format(
+                _percentile(latencies, 0.5) * 1000, _percentile(latencies, 0.99) * 1000,
+            ))
+            parts.append('{:.1f}% errors'.format(100.0 * sum([1 for call in calls if call[2]]) / len(calls)))
+        if failed:
+            parts.append('{!s} failed'.format(failed))
+        if self.in_flight is not None:
+            parts.append('{!s} in flight'.format(self.in_flight()))
+        if self.total and done < self.total:
+            parts.append('ETA {!s}'.format(_duration((self.total - done) / rate) if rate else '?'))
+        parts.append('{!s} elapsed'.format(_duration(now - self.started)))
+        return ' | '.join(parts)
+
+    def _draw(self, final=False):
+        if self.live:
+            # Overwrite the previous line and clear what's left of it. A line that wraps can't be overwritten.
+            line = self.line()[:shutil.get_terminal_size().columns - 1]
+            self.stream.write('\r' + line + '\033[K' + ('\n' if final else ''))
+        else:
+            self.stream.write(self.line() + '\n')
+        self.stream.flush()
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            self._draw()
+
+    def start(self):
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        """ Stop redrawing and show the final status.
+        """
+        if self.thread is None:
+            return
+        self.stop.set()
+        self.thread.join()
+        self.thread = None
+        self._draw(final=True)
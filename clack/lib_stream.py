@@ -0,0 +1,34 @@
+import sys
+import threading
+
+from queue import Queue
+
+_DONE = object()
+
+
+def prefetch(iterable, size=1000):
+    """ Consume `iterable` in a background thread and yield its items while the
+        thread keeps going. At most `size` items are buffered. Exceptions raised
+        by the iterable (including aborts) are re-raised in the consuming thread.
+    """
+    queue = Queue(maxsize=size)
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+        except BaseException:
+            queue.put((_DONE, sys.exc_info()))
+            return
+        queue.put((_DONE, None))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    while True:
+        item, exc_info = queue.get()
+        if item is _DONE:
+            if exc_info is not None:
+                raise exc_info[1].with_traceback(exc_info[2])
+            return
+        yield item
@@ -0,0 +1,104 @@
+import csv
+import json
+import re
+
+from .lib_diff import lookup
+
+TABLE_DIALECTS = {
+    'csv': csv.excel,
+    'tsv': csv.excel_tab,
+}
+
+PROJECTION_RE = re.compile(r'^(?:(?P<path>.*)\.)?\{(?P<columns>[^{}]*)\}$')
+
+
+def split_projection(path):
+    """ Returns the path and the columns of a filter path that ends with a
+        projection, e.g. videos.*.{key,title,custom.genre}. The columns are
+        None if there is no projection.
+    """
+    match = PROJECTION_RE.match(path or '')
+    if match is None:
+        return path, None
+    columns = [column.strip() for column in match.group('columns').split(',') if column.strip()]
+    return match.group('path') or '', columns
+
+
+def project(item, columns):
+    """ Returns the values at the paths `columns` of `item`, keyed by column.
+    """
+    return dict([(column, lookup(item, column)) for column in columns])
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    elif isinstance(value, (dict, list, bool)):
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return "{!s}".format(value)
+
+
+class TableWriter(object):
+    """ Writes items as the rows of a csv or tsv file. The first `buffer_size`
+        items are kept until the header is written: the columns are all keys of
+        those items, and a value column for items that aren't dicts. Later
+        items are written as soon as they are added; their keys that aren't
+        columns are left out, which is reported once per key through `warn`.
+        `prefix` are the names of extra columns that come first, like the key
+        of the row of a batch. Call `flush` after the last item.
+    """
+
+    def __init__(self, fp, output='csv', prefix=(), buffer_size=100, warn=None):
+        self.writer = csv.writer(fp, dialect=TABLE_DIALECTS[output], lineterminator='\n')
+        self.prefix = list(prefix)
+        self.buffer_size = buffer_size
+        self.warn = warn
+        self.buffer = []
+        self.columns = None
+        self.left_out = set()
+        self.num_rows = 0
+
+    def _write(self, item, prefix):
+        keys = list(item) if isinstance(item, dict) else ['value']
+        left_out = [key for key in keys if key not in self.columns and key not in self.left_out]
+        if left_out:
+            self.left_out.update(left_out)
+            if self.warn is not None:
+                self.warn("Row {!s} has values for {!s}, which are not in the columns and are left out.".format(
+                    self.num_rows + 1, ", ".join(["{!s}".format(key) for key in left_out]),
+                ))
+        if isinstance(item, dict):
+            values = [item.get(column) for column in self.columns]
+        else:
+            values = [item if column == 'value' else None for column in self.columns]
+        self.writer.writerow([_cell(value) for value in list(prefix) + values])
+        self.num_rows += 1
+
+    def flush(self):
+        """ Write the header and the buffered items, if that wasn't done yet.
+        """
+        if self.columns is not None or not self.buffer:
+            return
+        self.columns = []
+        for item, prefix in self.buffer:
+            for key in (item if isinstance(item, dict) else ['value']):
+                if key not in self.columns:
+                    self.columns.append(key)
+        self.writer.writerow(self.prefix + self.columns)
+        buffer, self.buffer = self.buffer, []
+        for item, prefix in buffer:
+            self._write(item, prefix)
+
+    def writerow(self, item, prefix=()):
+        if self.columns is not None:
+            return self._write(item, prefix)
+        self.buffer.append((item, prefix))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def writerows(self, items, prefix=()):
+        """ Write a row for every item of a list, or a single row for anything
+            else.
+        """
+        for item in (items if isinstance(items, list) else [items]):
+            self.writerow(item, prefix)
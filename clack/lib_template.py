@@ -0,0 +1,152 @@
+import ast
+import copy
+import json
+import os
+import re
+import threading
+
+PLACEHOLDER = re.compile(r'<<(\w+)>>')
+# Endpoints may have the <accountToken> like tokens that the account api client fills in.
+ENDPOINT = re.compile(r'^(?:[\w\-.~/]|<\w+>)+$')
+
+
+class TemplateError(Exception):
+
+    def __init__(self, message):
+        super(TemplateError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def parse_literal(text):
+    """ Parses params that are either json or a python literal. Json is tried
+        first, because it's parsed a lot faster than a python literal.
+    """
+    if text.lstrip()[:1] in ('{', '['):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return ast.literal_eval(text)
+
+
+_params_files = {}
+_params_files_lock = threading.Lock()
+
+
+def params_file(path):
+    """ Returns the template in the params file at `path`. Every file is read
+        and parsed only once, so all rows that use a file share its template.
+    """
+    path = os.path.abspath(path)
+    with _params_files_lock:
+        template = _params_files.get(path)
+    if template is None:
+        try:
+            with open(path, 'r', encoding='utf-8') as fp:
+                template = Template(fp.read())
+        except (IOError, OSError) as e:
+            raise TemplateError("The params file {!s} could not be read: {!s}".format(path, e.strerror))
+        with _params_files_lock:
+            template = _params_files.setdefault(path, template)
+    return template
+
+
+class Template(object):
+    """ A params or endpoint template with <<name>> placeholders.
+
+        Params templates that are valid json or python literals themselves are
+        parsed only once. Expanding them replaces placeholders in the parsed
+        structure, so values keep their type and never have to be escaped.
+        Other templates are expanded as text and parsed for every row.
+
+        Params that start with @ are read from a file. The path of the file may
+        contain placeholders too, to use a params file per row.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.names = set(PLACEHOLDER.findall(source or ''))
+        self.parsed = None
+        self.is_literal = False
+        self.path = None
+        if source is not None and source.startswith('@'):
+            self.path = Template(source[1:].strip())
+        elif source is not None:
+            try:
+                self.parsed = parse_literal(source)
+                self.is_literal = True
+            except (ValueError, SyntaxError):
+                pass
+
+    def _file(self, values):
+        return params_file(self.path.render(values))
+
+    def missing(self, values):
+        """ Returns the names of the placeholders that have no value in `values`.
+        """
+        missing = sorted([name for name in self.names if values.get(name) is None])
+        if self.path is not None and not missing:
+            try:
+                return self._file(values).missing(values)
+            except TemplateError:
+                pass
+        return missing
+
+    def parse(self):
+        """ Returns the parsed params without replacing any placeholders.
+        """
+        if self.path is not None:
+            # Templates of params files are shared, so their params are never handed out.
+            return copy.deepcopy(self._file({}).parse())
+        if self.source is not None and not self.is_literal:
+            raise TemplateError("The params could not be parsed: {!s}".format(self.source))
+        return self.parsed
+
+    def render(self, values):
+        """ Returns the template as text with all placeholders replaced.
+        """
+        if self.source is None:
+            return None
+        elif self.path is not None:
+            return self._file(values).render(values)
+        return PLACEHOLDER.sub(lambda m: "{!s}".format(values.get(m.group(1))), self.source)
+
+    def _substitute(self, obj, values):
+        if isinstance(obj, str):
+            match = PLACEHOLDER.match(obj)
+            if match and match.end() == len(obj):
+                return values.get(match.group(1))
+            return PLACEHOLDER.sub(lambda m: "{!s}".format(values.get(m.group(1))), obj)
+        elif isinstance(obj, dict):
+            return dict([(self._substitute(k, values), self._substitute(v, values)) for k, v in obj.items()])
+        elif isinstance(obj, list):
+            return [self._substitute(i, values) for i in obj]
+        elif isinstance(obj, tuple):
+            return tuple([self._substitute(i, values) for i in obj])
+        return obj
+
+    def expand(self, values):
+        """ Returns the parsed params with all placeholders replaced.
+        """
+        if self.source is None:
+            return None
+        elif self.path is not None:
+            return self._file(values).expand(values)
+        elif self.is_literal:
+            return self._substitute(self.parsed, values)
+        text = self.render(values)
+        try:
+            return parse_literal(text)
+        except (ValueError, SyntaxError):
+            raise TemplateError("The params could not be parsed: {!s}".format(text))
+
+    def endpoint(self, values):
+        """ Returns the endpoint with all placeholders replaced.
+        """
+        endpoint = self.render(values).strip('/ ')
+        if not ENDPOINT.match(endpoint):
+            raise TemplateError("Not a valid endpoint: {!s}".format(endpoint))
+        return endpoint
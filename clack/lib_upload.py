@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import requests
+import time
+
+# Number of bytes that are sent per request of an upload.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class UploadError(Exception):
+
+    def __init__(self, message, status_code=0):
+        super(UploadError, self).__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+    def __str__(self):
+        return self.message
+
+
+def upload_url(link):
+    """ Returns the upload url of the `link` in the response of a */create call.
+    """
+    return '{!s}://{!s}{!s}'.format(link.get('protocol', 'https'), link['address'], link['path'])
+
+
+class UploadState(object):
+    """ Remembers how far the upload of a file got, so an upload that was
+        interrupted continues where it stopped. There is a state file per
+        file, based on its path, size and modification time.
+    """
+
+    def __init__(self, directory, path):
+        stat = os.stat(path)
+        self.directory = directory
+        self.size = stat.st_size
+        key = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime])
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        self.path = os.path.join(directory, name + '.json')
+        self.data = {}
+        try:
+            with open(self.path, 'r') as fp:
+                self.data = json.load(fp)
+        except (IOError, ValueError):
+            pass
+
+    def save(self, **kwargs):
+        self.data.update(kwargs)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # Write to a temporary file first, so the state is never half written.
+        tmp_path = '{!s}.{!s}'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.data, fp)
+        os.rename(tmp_path, self.path)
+
+    def remove(self):
+        self.data = {}
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ResumableUpload(object):
+    """ Uploads a file to the `link` of a */create call of the ms1 api in
+        chunks of `chunk_size` bytes, with a Content-Range header per chunk.
+        Only one chunk is in memory at a time. Chunks that fail because of the
+        host are retried up to `retries` times.
+    """
+
+    def __init__(self, path, link, session_id, offset=0, chunk_size=UPLOAD_CHUNK_SIZE, verify=True, retries=3,
+                 log=None):
+        self.path = path
+        self.link = link
+        self.session_id = session_id
+        self.offset = offset
+        self.chunk_size = chunk_size
+        self.verify = verify
+        self.retries = retries
+        self.log = log
+        self.size = os.path.getsize(path)
+        self.session = requests.Session()
+        self.result = None
+
+    @property
+    def num_chunks(self):
+        return -(-(self.size - self.offset) // self.chunk_size)
+
+    def chunks(self):
+        """ Upload the file chunk by chunk, starting at `offset`. Yields the
+            offset after every chunk. The response of the upload is in `result`
+            once the last chunk is sent.
+        """
+        if not self.size:
+            raise UploadError('The file {!s} is empty.'.format(self.path))
+        with open(self.path, 'rb') as fp:
+            fp.seek(self.offset)
+            while self.offset < self.size:
+                chunk = fp.read(self.chunk_size)
+                self._send(chunk)
+                self.offset += len(chunk)
+                yield self.offset
+
+    def _post(self, params, chunk, headers, attempt=0):
+        started = time.time()
+        status = 0
+        try:
+            resp = self.session.post(upload_url(self.link), params=params, data=chunk, headers=headers,
+                                     verify=self.verify)
+            status = resp.status_code
+            return resp
+        finally:
+            if self.log is not None:
+                self.log('POST', upload_url(self.link), status, time.time() - started, len(chunk),
+                         content_range=headers['Content-Range'], attempt=attempt)
+
+    def _send(self, chunk):
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'Content-Disposition': 'attachment; filename="{!s}"'.format(os.path.basename(self.path)),
+            'Content-Range': 'bytes {!s}-{!s}/{!s}'.format(self.offset, self.offset + len(chunk) - 1, self.size),
+            'X-Session-ID': self.session_id,
+        }
+        params = dict(self.link.get('query') or {}, api_format='json')
+        for attempt in range(self.retries + 1):
+            try:
+                resp = self._post(params, chunk, headers, attempt=attempt)
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise UploadError('Uploading {!s} failed: {!s}'.format(self.path, e))
+            else:
+                if resp.status_code == 201:
+                    return
+                elif resp.status_code == 200:
+                    try:
+                        self.result = resp.json()
+                    except ValueError:
+                        self.result = resp.text
+                    return
+                elif resp.status_code < 500 or attempt == self.retries:
+                    raise UploadError('Uploading {!s} failed with status {!s}: {!s}'.format(
+                        self.path, resp.status_code, resp.text,
+                    ), status_code=resp.status_code)
+            time.sleep(2 ** attempt)
@@ -16,9 +16,10 @@ setup(
     keywords='development command line tool api interface jwplayer',
     url='https://github.com/rmnl/clack',
     packages=find_packages(),
+    python_requires='>=3.6',
     include_package_data=True,
     install_requires=[
-        'Click>=6.6',
+        'Click>=7.0',
         'keyring>=5.7.1',
         'requests>=2.10.0',
         'jwplatform>=1.1.0',
@@ -26,7 +27,7 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'clack = clack.cli:clack',
+            'clack = clack.__main__:main',
             # 'clack = clack.cli:call',
             # 'clack_config = clack.cli:settings_group',
         ],
@@ -36,6 +37,7 @@ setup(
         'Intended Audience :: Developers',
         'Topic :: Utilities',
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
 )
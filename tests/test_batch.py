@@ -0,0 +1,240 @@
+import threading
+import time
+
+import pytest
+
+from clack.cmd_call import CallCommands
+from clack.lib_batch import AIMDController
+from clack.lib_batch import BatchExecutor
+from clack.lib_batch import CircuitBreaker
+from clack.lib_batch import SingleFlight
+
+
+def test_identical_calls_in_flight_are_made_once():
+    flights, started, release = SingleFlight(), threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    leader = threading.Thread(target=lambda: results.append(flights.do('key', call)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do('key', call))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert calls == [1]
+    assert results == ['result'] * 4
+    assert flights.shared == 3
+
+
+def test_results_are_kept_for_later_calls():
+    flights, calls = SingleFlight(), []
+    call = lambda: calls.append(1) or len(calls)
+    assert flights.do('key', call) == 1
+    assert flights.do('key', call) == 1
+    assert flights.do('other', call) == 2
+    assert calls == [1, 1]
+
+
+def test_results_that_should_not_be_kept_are_forgotten():
+    flights, calls = SingleFlight(), []
+    call = lambda: calls.append(1) or (False, len(calls))
+    assert flights.do('key', call, keep=lambda result: result[0]) == (False, 1)
+    assert flights.do('key', call, keep=lambda result: result[0]) == (False, 2)
+    assert flights.shared == 0
+
+
+def test_exceptions_are_not_shared():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError('boom')
+    with pytest.raises(ValueError):
+        flights.do('key', fail)
+    assert flights.do('key', lambda: 'ok') == 'ok'
+
+
+def test_oldest_results_are_forgotten_first():
+    flights = SingleFlight(max_size=2)
+    for key in ('a', 'b', 'c'):
+        flights.do(key, lambda: key)
+    assert flights.do('a', lambda: 'again') == 'again'
+    assert flights.do('c', lambda: 'again') == 'c'
+
+
+@pytest.mark.parametrize('params', [
+    {'tags': {'a'}}, {'data': b'abc'}, {('a', 1): 'b'}, {1: 'a', 'b': 2}, None,
+])
+def test_flight_keys_of_any_params(params):
+    assert CallCommands._flight_key('videos/show', params) == CallCommands._flight_key('videos/show', params)
+    assert CallCommands._flight_key('videos/show', params) != CallCommands._flight_key('videos/list', params)
+
+
+def test_circuit_opens_after_failures_in_a_row():
+    logs = []
+    circuit = CircuitBreaker('host', threshold=3, cooldown=60, log=logs.append)
+    for failed in (True, True, False, True, True):
+        circuit.after(failed)
+    assert circuit.state == CircuitBreaker.CLOSED
+    circuit.after(True)
+    assert circuit.state == CircuitBreaker.OPEN
+    assert logs == ['Circuit for host is open, because 3 calls in a row failed. Pausing calls for 60 seconds.']
+
+
+def test_failed_probe_doubles_the_cooldown():
+    circuit = CircuitBreaker('host', threshold=1, cooldown=0.01, max_cooldown=0.03)
+    circuit.after(True)
+    for cooldown in (0.02, 0.03, 0.03):
+        time.sleep(circuit.cooldown)
+        circuit.before()
+        assert circuit.state == CircuitBreaker.HALF_OPEN
+        circuit.after(True)
+        assert circuit.state == CircuitBreaker.OPEN
+        assert circuit.cooldown == cooldown
+
+
+def test_successful_probe_closes_the_circuit():
+    circuit = CircuitBreaker('host', threshold=1, cooldown=0.01)
+    circuit.after(True)
+    circuit.after(True)
+    time.sleep(0.01)
+    circuit.before()
+    circuit.after(False)
+    assert circuit.state == CircuitBreaker.CLOSED
+    assert circuit.cooldown == 0.01
+    circuit.before()
+
+
+def test_calls_wait_for_the_probe():
+    circuit = CircuitBreaker('host', threshold=1, cooldown=0.01)
+    circuit.after(True)
+    time.sleep(0.01)
+    circuit.before()
+    waited = []
+    waiting = threading.Thread(target=lambda: circuit.before() or waited.append(circuit.state))
+    waiting.start()
+    waiting.join(0.1)
+    assert waited == []
+    circuit.after(False)
+    waiting.join(5)
+    assert waited == [CircuitBreaker.CLOSED]
+
+
+def _window(controller, latency=0.1, num_throttled=0):
+    """ Finish a full window of calls.
+    """
+    size = controller.limit
+    for i in range(size):
+        controller.acquire()
+    for i in range(size):
+        controller.release(latency, throttled=i < num_throttled)
+
+
+def test_limit_goes_up_by_one_per_window():
+    logs = []
+    controller = AIMDController(min_limit=1, max_limit=4, log=logs.append)
+    limits = []
+    for _ in range(5):
+        _window(controller)
+        limits.append(controller.limit)
+    assert limits == [2, 3, 4, 4, 4]
+    assert logs[0] == 'Concurrency 1 -> 2: latency is 0.100s'
+
+
+def test_limit_is_halved_after_throttled_calls():
+    controller = AIMDController(min_limit=1, max_limit=16)
+    for _ in range(7):
+        _window(controller)
+    assert controller.limit == 8
+    _window(controller, num_throttled=1)
+    assert controller.limit == 4
+    _window(controller, num_throttled=4)
+    _window(controller, num_throttled=2)
+    _window(controller, num_throttled=1)
+    assert controller.limit == 1
+
+
+def test_limit_is_halved_when_latency_goes_up():
+    controller = AIMDController(min_limit=2, max_limit=16, latency_factor=2.0)
+    for _ in range(4):
+        _window(controller, latency=0.1)
+    assert controller.limit == 6
+    _window(controller, latency=0.15)
+    assert controller.limit == 7
+    _window(controller, latency=0.5)
+    assert controller.limit == 3
+    _window(controller, latency=0.5)
+    assert controller.limit == 2
+
+
+def test_calls_wait_for_the_limit():
+    controller = AIMDController(min_limit=1, max_limit=1)
+    controller.acquire()
+    acquired = threading.Event()
+    waiting = threading.Thread(target=lambda: controller.acquire() or acquired.set())
+    waiting.start()
+    assert not acquired.wait(0.1)
+    controller.release(0.1)
+    assert acquired.wait(5)
+    waiting.join()
+
+
+class Controller(object):
+    """ A fixed limit that remembers every finished call.
+    """
+
+    def __init__(self, limit):
+        self.max_limit = limit
+        self.semaphore = threading.Semaphore(limit)
+        self.released = []
+
+    def acquire(self):
+        self.semaphore.acquire()
+
+    def release(self, latency=None, throttled=False):
+        if latency is not None:
+            self.released.append(throttled)
+        self.semaphore.release()
+
+
+def test_tasks_start_in_input_order():
+    started = []
+    executor = BatchExecutor(lambda task: started.append(task) or task, Controller(1))
+    assert list(executor.map(range(20))) == list(range(20))
+    assert started == list(range(20))
+
+
+def test_all_tasks_are_done_once():
+    executor = BatchExecutor(lambda task: task * 2, Controller(8))
+    assert sorted(executor.map(range(100))) == [task * 2 for task in range(100)]
+
+
+def test_throttled_results_are_reported_to_the_controller():
+    controller = Controller(4)
+    executor = BatchExecutor(lambda task: task, controller, is_throttled=lambda result: result % 2 == 1)
+    list(executor.map(range(10)))
+    assert sorted(controller.released) == [False] * 5 + [True] * 5
+
+
+def test_exceptions_are_failed_calls():
+    controller = Controller(1)
+
+    def work(task):
+        if task == 2:
+            raise ValueError('boom')
+        return task
+    with pytest.raises(ValueError):
+        list(BatchExecutor(work, controller).map(range(5)))
+    assert controller.released[:3] == [False, False, True]
+
+
+@pytest.mark.parametrize('status, throttled', [(200, False), (404, False), (429, True), (503, True), (0, True)])
+def test_throttled_calls(status, throttled):
+    assert CallCommands._is_throttled(('key', {}, 'videos/show', {}, status, 'result', 0.1)) == throttled
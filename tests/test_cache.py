@@ -0,0 +1,118 @@
+import os
+import time
+
+from clack.lib_cache import MemoryCache
+from clack.lib_cache import ResponseCache
+from clack.lib_cassette import CassetteResponse
+
+INFO = {'api': 'ac2', 'method': 'GET', 'url': 'https://api.example.com/v2/sites/', 'params': None, 'data': None}
+
+
+class Server(object):
+    """ Sends the responses it is given and remembers the conditional headers
+        of every request.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, conditional=None):
+        self.requests.append(conditional or {})
+        return self.responses.pop(0)
+
+
+def _cache(tmpdir, **kwargs):
+    return ResponseCache(str(tmpdir.join('cache')), **kwargs)
+
+
+def test_fresh_responses_are_served_from_the_cache(tmpdir):
+    cache = _cache(tmpdir, ttl=60)
+    server = Server(CassetteResponse(text='"one"'))
+    assert cache.request(server, INFO).text == '"one"'
+    assert cache.request(server, INFO).text == '"one"'
+    assert cache.lookup(INFO).text == '"one"'
+    assert len(server.requests) == 1
+
+
+def test_stale_responses_are_revalidated(tmpdir):
+    cache = _cache(tmpdir, ttl=0)
+    server = Server(
+        CassetteResponse(text='"one"', headers={'ETag': '"e1"', 'Last-Modified': 'Mon, 05 Oct 2026 10:00:00 GMT'}),
+        CassetteResponse(status_code=304),
+    )
+    assert cache.lookup(INFO) is None
+    cache.request(server, INFO)
+    assert cache.lookup(INFO) is None
+    resp = cache.request(server, INFO)
+    assert server.requests == [{}, {'If-None-Match': '"e1"', 'If-Modified-Since': 'Mon, 05 Oct 2026 10:00:00 GMT'}]
+    assert resp.status_code == 200 and resp.text == '"one"'
+
+
+def test_changed_responses_replace_the_cached_one(tmpdir):
+    cache = _cache(tmpdir, ttl=0)
+    server = Server(
+        CassetteResponse(text='"one"', headers={'ETag': '"e1"'}),
+        CassetteResponse(text='"two"', headers={'ETag': '"e2"'}),
+        CassetteResponse(status_code=304),
+    )
+    cache.request(server, INFO)
+    assert cache.request(server, INFO).text == '"two"'
+    assert cache.request(server, INFO).text == '"two"'
+    assert server.requests[2] == {'If-None-Match': '"e2"'}
+
+
+def test_errors_are_not_cached(tmpdir):
+    cache = _cache(tmpdir, ttl=60)
+    server = Server(CassetteResponse(status_code=500, text='"error"'), CassetteResponse(text='"one"'))
+    assert cache.request(server, INFO).status_code == 500
+    assert cache.request(server, INFO).text == '"one"'
+
+
+def test_responses_are_cached_per_scope(tmpdir):
+    cache = _cache(tmpdir, ttl=60)
+    cache.request(Server(CassetteResponse(text='"one"')), INFO, scope='user1')
+    assert cache.lookup(INFO, scope='user1') is not None
+    assert cache.lookup(INFO, scope='user2') is None
+
+
+def test_least_recently_used_responses_are_evicted(tmpdir):
+    cache = _cache(tmpdir, ttl=60, max_size=250)
+    for i in range(3):
+        info = dict(INFO, params={'page': i})
+        cache.request(Server(CassetteResponse(text='"{!s}"'.format('x' * 50))), info)
+        # Make sure every response was used at a different time.
+        path = cache._path(info)
+        os.utime(path, (time.time() - 10 + i, time.time() - 10 + i))
+    cache.request(Server(CassetteResponse(text='"{!s}"'.format('y' * 50))), dict(INFO, params={'page': 3}))
+    assert cache.lookup(dict(INFO, params={'page': 0})) is None
+    assert cache.lookup(dict(INFO, params={'page': 3})) is not None
+
+
+def test_revalidated_responses_are_counted_once(tmpdir):
+    cache = _cache(tmpdir, ttl=0)
+    server = Server(CassetteResponse(text='"one"', headers={'ETag': '"e1"'}), *[CassetteResponse(status_code=304)] * 5)
+    cache.request(server, INFO)
+    cache._evict()
+    size = cache.size
+    for _ in range(5):
+        cache.request(server, INFO)
+    assert abs(cache.size - size) < 10
+
+
+def test_temporary_files_are_not_evicted(tmpdir):
+    cache = _cache(tmpdir, ttl=60, max_size=0)
+    tmp_path = os.path.join(cache.directory, 'abc.json.1.tmp')
+    with open(tmp_path, 'w') as fp:
+        fp.write('{}')
+    cache.request(Server(CassetteResponse(text='"one"')), INFO)
+    assert os.path.exists(tmp_path)
+    assert os.listdir(cache.directory) == ['abc.json.1.tmp']
+
+
+def test_memory_cache_revalidates_without_files():
+    cache = MemoryCache(ttl=0)
+    server = Server(CassetteResponse(text='"one"', headers={'ETag': '"e1"'}), CassetteResponse(status_code=304))
+    cache.request(server, INFO)
+    assert cache.request(server, INFO).text == '"one"'
+    assert server.requests == [{}, {'If-None-Match': '"e1"'}]
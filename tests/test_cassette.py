@@ -0,0 +1,71 @@
+import json
+import threading
+
+from clack.lib_cassette import Cassette
+from clack.lib_cassette import CassetteResponse
+
+
+def _record(path, url, texts, data=None):
+    cassette = Cassette(path, mode='record')
+    info = Cassette.request_info('ac2', 'POST', url, data=data)
+    for text in texts:
+        cassette.request(lambda: CassetteResponse(text=text, url=url), info)
+    cassette.close()
+    return info
+
+
+def test_session_responses_are_redacted(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    url = 'https://api.example.com/v2/account/sessions/start/'
+    info = _record(path, url, [json.dumps({'return_value': {'signature': 'secret', 'accounts': {'a': {}}}})],
+                   data=json.dumps({'userEmail': 'me@example.com', 'userPassword': 'secret'}))
+    with open(path) as fp:
+        recorded = fp.read()
+    assert 'secret' not in recorded
+    assert 'me@example.com' not in recorded
+    resp = Cassette(path, mode='replay').request(lambda: None, info)
+    assert resp.json() == {'return_value': {'signature': '********', 'accounts': {'a': {}}}}
+
+
+def test_admin_session_responses_are_redacted(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    _record(path, 'https://api.example.com/v2/admin/sessions/', [json.dumps({'return_value': {'id': 'secret'}})])
+    with open(path) as fp:
+        assert 'secret' not in fp.read()
+
+
+def test_user_sessions_are_redacted(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    url = 'https://api.example.com/v2/admin/users/abc/session/'
+    info = _record(path, url, [json.dumps({'return_value': {'signature': 'secret', 'id': 'abc'}})])
+    with open(path) as fp:
+        assert 'secret' not in fp.read()
+    resp = Cassette(path, mode='replay').request(lambda: None, info)
+    assert resp.json() == {'return_value': {'signature': '********', 'id': 'abc'}}
+
+
+def test_other_responses_are_recorded_as_they_are(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    text = json.dumps({'return_value': {'id': 'abc'}})
+    info = _record(path, 'https://api.example.com/v2/sites/', [text])
+    assert Cassette(path, mode='replay').request(lambda: None, info).text == text
+
+
+def test_identical_requests_are_replayed_in_order(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    texts = ["{!s}".format(i) for i in range(50)]
+    info = _record(path, 'https://api.example.com/v2/sites/', texts)
+    cassette = Cassette(path, mode='replay')
+    replayed = []
+
+    def replay():
+        for _ in range(10):
+            replayed.append(cassette.request(lambda: None, info).text)
+    threads = [threading.Thread(target=replay) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(replayed, key=int) == texts
+    # The last response is reused once the recorded ones are used up.
+    assert cassette.request(lambda: None, info).text == '49'
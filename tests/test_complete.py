@@ -0,0 +1,10 @@
+import click
+
+from clack.environment import Environment
+from clack.lib_complete import APP_NAME
+from clack.lib_complete import app_dir
+
+
+def test_app_dir_is_the_directory_of_the_config_file():
+    assert app_dir() == click.get_app_dir(APP_NAME, force_posix=True)
+    assert Environment.config_path().startswith(app_dir())
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from clack.lib_diff import align
+from clack.lib_input import InputError
+from clack.lib_input import read_documents
+
+
+def _write(tmpdir, name, text):
+    path = tmpdir.join(name)
+    path.write(text)
+    return str(path)
+
+
+def test_json_lines_are_read_with_their_position(tmpdir):
+    path = _write(tmpdir, 'a.jsonl', '{"key": "a"}\n\n{"key": "b"}\n')
+    assert list(read_documents(path)) == [(0, {'key': 'a'}), (1, {'key': 'b'})]
+
+
+def test_batch_output_is_read_by_row(tmpdir):
+    path = _write(tmpdir, 'a.json', json.dumps({'row1': {'key': 'a'}, 'row2': {'key': 'b'}}, indent=4))
+    assert list(read_documents(path)) == [('row1', {'key': 'a'}), ('row2', {'key': 'b'})]
+
+
+def test_json_array_is_read_by_index(tmpdir):
+    path = _write(tmpdir, 'a.json', json.dumps([{'key': 'a'}, {'key': 'b'}], indent=4))
+    assert list(read_documents(path)) == [(0, {'key': 'a'}), (1, {'key': 'b'})]
+
+
+def test_invalid_json(tmpdir):
+    path = _write(tmpdir, 'a.json', '{"key": "a"}\nnope\n')
+    with pytest.raises(InputError):
+        list(read_documents(path))
+
+
+def test_align_by_row_key():
+    old = [('row1', {'a': 1}), ('row2', {'a': 2})]
+    new = [('row2', {'a': 3}), ('row3', {'a': 4})]
+    assert list(align(old, new)) == [
+        ('row2', {'a': 2}, {'a': 3}),
+        ('row1', {'a': 1}, None),
+        ('row3', None, {'a': 4}),
+    ]
+
+
+def test_align_by_key_path():
+    old = enumerate([{'video': {'key': 'x'}, 'n': 1}, {'video': {'key': 'y'}, 'n': 2}])
+    new = enumerate([{'video': {'key': 'y'}, 'n': 3}, {'video': {'key': 'x'}, 'n': 1}])
+    pairs = dict([(key, (old_record['n'], new_record['n'])) for key, old_record, new_record in align(
+        old, new, 'video.key'
+    )])
+    assert pairs == {'x': (1, 1), 'y': (2, 3)}
+
+
+def test_align_window():
+    old = enumerate([{'key': 'a'}, {'key': 'b'}, {'key': 'c'}])
+    new = enumerate([{'key': 'c'}, {'key': 'b'}, {'key': 'a'}])
+    results = [(key, old_record is not None, new_record is not None)
+               for key, old_record, new_record in align(old, new, 'key', window=1)]
+    assert ('b', True, True) in results
+    assert ('a', True, False) in results and ('a', False, True) in results
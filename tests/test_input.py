@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from clack.lib_input import read_rows
+from clack.lib_input import shard_ranges
+
+
+def _csv(tmpdir, num_rows):
+    path = tmpdir.join('input.csv')
+    path.write('video_key,title\n' + ''.join(['v{:d},Video {:d}\n'.format(i, i) for i in range(num_rows)]))
+    return str(path)
+
+
+def _sharded_keys(path, num_shards):
+    return [[key for key, values in read_rows(path, byte_range=byte_range)]
+            for byte_range in shard_ranges(path, num_shards)]
+
+
+@pytest.mark.parametrize('num_shards', [1, 2, 3, 7])
+def test_every_row_is_in_a_single_shard(tmpdir, num_shards):
+    path = _csv(tmpdir, 100)
+    shards = _sharded_keys(path, num_shards)
+    assert len(shards) == num_shards
+    assert [key for keys in shards for key in keys] == ['v{:d}'.format(i) for i in range(100)]
+
+
+def test_ranges_start_and_end_at_line_boundaries(tmpdir):
+    path = _csv(tmpdir, 10)
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    ranges = shard_ranges(path, 4)
+    assert ranges[0][0] == len(b'video_key,title\n')
+    assert ranges[-1][1] == len(data)
+    for start, end in ranges:
+        assert data[start - 1:start] == b'\n' and data[end - 1:end] == b'\n'
+    assert [end for start, end in ranges[:-1]] == [start for start, end in ranges[1:]]
+
+
+def test_no_more_shards_than_rows(tmpdir):
+    path = _csv(tmpdir, 2)
+    assert [len(keys) for keys in _sharded_keys(path, 5)] == [1, 1]
+
+
+def test_header_only(tmpdir):
+    assert shard_ranges(_csv(tmpdir, 0), 3) == []
+
+
+def test_json_lines_have_no_header(tmpdir):
+    path = tmpdir.join('input.jsonl')
+    path.write(''.join([json.dumps({'key': 'v{:d}'.format(i)}) + '\n' for i in range(9)]))
+    shards = _sharded_keys(str(path), 3)
+    assert [key for keys in shards for key in keys] == ['v{:d}'.format(i) for i in range(9)]
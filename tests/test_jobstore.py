@@ -0,0 +1,39 @@
+import os
+
+from clack.lib_jobstore import JobStore
+
+
+def _failed_job(path, num_rows):
+    store = JobStore(path, endpoint='videos/show', params='{}')
+    for i in range(num_rows):
+        store.add('k{!s}'.format(i), {'video_key': 'k{!s}'.format(i)}, 'videos/show', {}, 500, 0.1, 'Error: 500')
+    store.close()
+    return store.job_id
+
+
+def test_retry_more_failures_than_batch_size(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    job_id = _failed_job(path, 1200)
+    retry = JobStore(path, endpoint='videos/show', params='{}', batch_size=500)
+    num_rows = 0
+    for row_key, values in JobStore.failed_rows(path, job_id):
+        retry.add(row_key, values, 'videos/show', {}, 200, 0.1, 'success')
+        num_rows += 1
+    assert num_rows == 1200
+    assert retry.stats() == {'200': {'calls': 1200, 'avg latency': 0.1, 'max latency': 0.1}}
+    retry.close()
+
+
+def test_failed_rows_are_those_of_the_job(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    job_id = _failed_job(path, 3)
+    _failed_job(path, 2)
+    rows = list(JobStore.failed_rows(path, job_id))
+    assert rows == [('k0', {'video_key': 'k0'}), ('k1', {'video_key': 'k1'}), ('k2', {'video_key': 'k2'})]
+    assert JobStore.last_job_id(path) == job_id + 1
+
+
+def test_no_last_job_without_a_database(tmpdir):
+    path = str(tmpdir.join('missing.db'))
+    assert JobStore.last_job_id(path) is None
+    assert not os.path.exists(path)
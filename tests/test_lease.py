@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+import pytest
+
+from clack.lib_lease import LeaseDir
+from clack.lib_lease import LeaseError
+
+
+def _leases(tmpdir, *instances, **kwargs):
+    return [LeaseDir(str(tmpdir.join('leases')), instance=instance, **kwargs) for instance in instances]
+
+
+def test_a_chunk_is_claimed_by_a_single_instance(tmpdir):
+    a, b = _leases(tmpdir, 'a', 'b')
+    assert a.claim(0)
+    assert not b.claim(0)
+    assert b.claim(1)
+    assert a.status(3) == {'done': 0, 'leased': 2, 'pending': 1}
+
+
+def test_concurrent_claims(tmpdir):
+    leases = _leases(tmpdir, *['instance{:d}'.format(i) for i in range(10)])
+    claimed = []
+    threads = [threading.Thread(target=lambda lease=lease: lease.claim(0) and claimed.append(lease.instance))
+               for lease in leases]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == 1
+
+
+def test_stale_leases_are_taken_over(tmpdir):
+    a, b = _leases(tmpdir, 'a', 'b', ttl=60)
+    assert a.claim(0)
+    stale = time.time() - 120
+    os.utime(a._file(0, 'lease'), (stale, stale))
+    assert b.claim(0)
+    assert not a.claim(0)
+
+
+def test_done_chunks_are_not_claimed(tmpdir):
+    a, b = _leases(tmpdir, 'a', 'b', ttl=0)
+    assert a.claim(0)
+    assert a.complete(0)
+    assert not b.claim(0)
+    assert a.status(1) == {'done': 1, 'leased': 0, 'pending': 0}
+
+
+def test_the_first_instance_that_completes_a_chunk_wins(tmpdir):
+    a, b = _leases(tmpdir, 'a', 'b', ttl=0)
+    assert a.claim(0)
+    assert b.claim(0)
+    assert b.complete(0)
+    assert not a.complete(0)
+    assert a.done_by(0) == 'b'
+
+
+def test_a_lease_dir_is_used_for_a_single_job(tmpdir):
+    a, b = _leases(tmpdir, 'a', 'b')
+    a.join({'endpoint': 'videos/show', 'params': None})
+    b.join({'endpoint': 'videos/show', 'params': None})
+    with pytest.raises(LeaseError):
+        b.join({'endpoint': 'videos/delete', 'params': None})
@@ -0,0 +1,52 @@
+import json
+
+from clack.lib_cassette import CassetteResponse
+from clack.lib_portal_api import PortalAPI
+
+
+class Session(object):
+    """ Answers like the account api: a new admin session for every session
+        request, 401 for requests with the first session and 415 for
+        compressed bodies.
+    """
+
+    def __init__(self):
+        self.sessions = 0
+
+    def request(self, method, url, data=None, params=None, verify=True, headers=None):
+        if url.endswith('/admin/sessions/'):
+            self.sessions += 1
+            return CassetteResponse(text=json.dumps({'return_value': {'id': 'session{:d}'.format(self.sessions)}}))
+        elif headers.get('Authorization') == 'session1':
+            return CassetteResponse(status_code=401, text='{}')
+        elif headers.get('Content-Encoding') == 'gzip':
+            return CassetteResponse(status_code=415, text='{}')
+        return CassetteResponse(text=json.dumps({'return_value': {'ok': True}}))
+
+
+def _client(**kwargs):
+    requests = []
+    client = PortalAPI(username='admin', password='secret', api_url='https://api.example.com', is_admin=True,
+                       request_log=lambda *args, **fields: requests.append((args[1], fields.get('attempt', 0))),
+                       **kwargs)
+    client.session = Session()
+    return client, requests
+
+
+def test_requests_with_a_renewed_session_are_retries():
+    client, requests = _client()
+    assert client.get('sites') == {'ok': True}
+    assert requests == [
+        ('https://api.example.com/v2/admin/sessions/', 0),
+        ('https://api.example.com/v2/sites/', 0),
+        ('https://api.example.com/v2/admin/sessions/', 0),
+        ('https://api.example.com/v2/sites/', 1),
+    ]
+
+
+def test_uncompressed_requests_are_retries():
+    client, requests = _client(compress_requests=True)
+    client.signature = 'session2'
+    assert client.post('sites', {'name': 'x' * 20000}) == {'ok': True}
+    assert requests == [('https://api.example.com/v2/sites/', 0), ('https://api.example.com/v2/sites/', 1)]
+    assert not client.compress_requests
@@ -0,0 +1,48 @@
+import io
+
+from clack.lib_table import TableWriter
+from clack.lib_table import split_projection
+
+
+def _table(items, **kwargs):
+    fp, warnings = io.StringIO(), []
+    table = TableWriter(fp, warn=warnings.append, **kwargs)
+    table.writerows(items)
+    table.flush()
+    return fp.getvalue().splitlines(), warnings, table
+
+
+def test_columns_are_the_keys_of_all_buffered_items():
+    lines, warnings, table = _table([{'a': 1}, {'a': 2, 'b': 3}])
+    assert lines == ['a,b', '1,', '2,3']
+    assert warnings == []
+    assert table.num_rows == 2
+
+
+def test_items_that_are_not_dicts_have_a_value_column():
+    lines, warnings, _ = _table([1, {'a': 2}, [3]])
+    assert lines == ['value,a', '1,', ',2', '[3],']
+
+
+def test_keys_after_the_header_are_reported_once():
+    lines, warnings, _ = _table([{'a': 1}, {'a': 2, 'b': 3}, {'b': 4}], buffer_size=1)
+    assert lines == ['a', '1', '2', '""']
+    assert len(warnings) == 1 and 'b' in warnings[0]
+
+
+def test_prefix_columns():
+    fp = io.StringIO()
+    table = TableWriter(fp, output='tsv', prefix=['row_key'])
+    table.writerows([{'a': 1}, {'a': 2}], prefix=['row1'])
+    table.flush()
+    assert fp.getvalue().splitlines() == ['row_key\ta', 'row1\t1', 'row1\t2']
+
+
+def test_nothing_is_written_without_items():
+    lines, _, _ = _table([])
+    assert lines == []
+
+
+def test_split_projection():
+    assert split_projection('videos.*.{key, title,custom.genre}') == ('videos.*', ['key', 'title', 'custom.genre'])
+    assert split_projection('videos.*.key') == ('videos.*.key', None)
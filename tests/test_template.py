@@ -0,0 +1,23 @@
+import pytest
+
+from clack.lib_template import Template
+from clack.lib_template import TemplateError
+
+
+def test_endpoint_with_values():
+    assert Template('/videos/<<key>>/show/').endpoint({'key': 'abc-1'}) == 'videos/abc-1/show'
+
+
+def test_endpoint_with_account_tokens():
+    template = Template('v2/accounts/<accountToken>/users/<<u>>')
+    assert template.endpoint({'u': 'abc'}) == 'v2/accounts/<accountToken>/users/abc'
+
+
+@pytest.mark.parametrize('value', ['a/../b?x=1', 'a b', 'a#b', '<a b>'])
+def test_endpoint_with_invalid_values(value):
+    with pytest.raises(TemplateError):
+        Template('videos/<<key>>').endpoint({'key': value})
+
+
+def test_missing_values():
+    assert Template('v2/<<a>>/<accountToken>/<<b>>').missing({'a': 1}) == ['b']